@@ -0,0 +1,73 @@
+import logging
+import os
+from datetime import datetime
+
+import pytz
+import requests
+
+from ..config import settings
+from ..utils.handle_missing import handle_missing
+from ..utils.logger import MyLogger, log
+from ..utils.single_flight import single_flight
+
+# Akahu account ID environment variable for each platform/account we snapshot
+ACCOUNTS: list[tuple[str, str, str]] = [
+    ("ASB", "6 month term deposit", "ASB_6_MONTH_ID"),
+    ("ASB", "12 month term deposit", "ASB_12_MONTH_ID"),
+    ("BNZ", "Rapid Save", "BNZ_SAVE_ID"),
+    ("Kernel Wealth", "Save", "KERNEL_SAVE_ID"),
+    ("Kernel Wealth", "Portfolio", "KERNEL_FUND_ID"),
+    ("Sharesies", "Portfolio", "SHARESIES_ID"),
+    ("Simplicity", "Kiwisaver", "SIMPLICITY_ID"),
+]
+
+
+class Controller:
+    def __init__(
+        self, akahu_id: str | None = None, auth_token: str | None = None
+    ) -> None:
+        """Akahu client, using a tenant's credentials or else the environment's."""
+        self.logger: logging.Logger = MyLogger().get_logger()
+        self.tz: pytz.BaseTzInfo = pytz.timezone("Pacific/Auckland")
+        self.akahu_url = settings.akahu_url
+        self.headers = {
+            "X-Akahu-ID": akahu_id or os.environ["AKAHU_ID"],
+            "Authorization": f"Bearer {auth_token or os.environ['AUTH_TOKEN']}",
+            "accept": "application/json",
+        }
+
+    @log
+    @single_flight
+    @handle_missing
+    def get_balance(self, account_id: str, balance_field: str = "current") -> float:
+        account = requests.get(
+            f"{self.akahu_url}/accounts/{account_id}",
+            headers=self.headers,
+            timeout=5,
+        ).json()
+        return account["item"]["balance"][balance_field]
+
+    @log
+    def get_transactions(
+        self, account_id: str, start: datetime | None = None
+    ) -> list[dict]:
+        """Fetch an account's settled transactions, following Akahu's page cursor.
+
+        :param account_id: Akahu account ID
+        :param start: Only return transactions after this time, defaults to all
+        :return: Raw Akahu transaction items
+        """
+        params = {} if start is None else {"start": start.isoformat()}
+        transactions = []
+        while True:
+            page = requests.get(
+                f"{self.akahu_url}/accounts/{account_id}/transactions",
+                headers=self.headers,
+                params=params,
+                timeout=5,
+            ).json()
+            transactions.extend(page["items"])
+            next_cursor = (page.get("cursor") or {}).get("next")
+            if next_cursor is None:
+                return transactions
+            params["cursor"] = next_cursor
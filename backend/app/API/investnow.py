@@ -4,6 +4,7 @@ import os
 import pytz
 import requests
 
+from ..config import settings
 from ..utils.handle_missing import handle_missing
 from ..utils.logger import MyLogger, log
 
@@ -12,7 +13,7 @@ class Controller:
     def __init__(self) -> None:
         self.logger: logging.Logger = MyLogger().get_logger()
         self.tz: pytz.BaseTzInfo = pytz.timezone("Pacific/Auckland")
-        self.akahu_url = "https://api.akahu.io/v1"
+        self.akahu_url = settings.akahu_url
         self.headers = {
             "X-Akahu-ID": os.environ["AKAHU_ID"],
             "Authorization": f"Bearer {os.environ['AUTH_TOKEN']}",
@@ -41,7 +42,7 @@ class Controller:
             payload["passcode"] = passcode
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         res = requests.post(
-            "https://loginapi.adminis.co.nz/connect/token",
+            f"{settings.investnow_login_url}/connect/token",
             data=payload,
             headers=headers,
             timeout=5,
@@ -56,7 +57,7 @@ class Controller:
         headers = {"Authorization": f"Bearer {token}"}
 
         res = requests.get(
-            "https://webapi.adminis.co.nz/api/portfolio/90652/trialBalance",
+            f"{settings.investnow_api_url}/api/portfolio/90652/trialBalance",
             headers=headers,
             timeout=5,
         ).json()
@@ -4,15 +4,17 @@ import os
 import pytz
 import requests
 
+from ..config import settings
 from ..utils.handle_missing import handle_missing
 from ..utils.logger import MyLogger, log
+from ..utils.single_flight import single_flight
 
 
 class Controller:
     def __init__(self) -> None:
         self.logger: logging.Logger = MyLogger().get_logger()
         self.tz: pytz.BaseTzInfo = pytz.timezone("Pacific/Auckland")
-        self.akahu_url = "https://api.akahu.io/v1"
+        self.akahu_url = settings.akahu_url
         self.headers = {
             "X-Akahu-ID": os.environ["AKAHU_ID"],
             "Authorization": f"Bearer {os.environ['AUTH_TOKEN']}",
@@ -20,6 +22,7 @@ class Controller:
         }
 
     @log
+    @single_flight
     @handle_missing
     def get_portfolio_value(self) -> float:
         account = requests.get(
@@ -1,35 +1,64 @@
-from datetime import date
+import functools
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Annotated
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
 from .config import settings
+from .router.ASB import get_rows as get_asb_rows
 from .router.ASB import router as ASBRouter
 from .router.ASB import save_data as save_asb
+from .router.BNZ import get_rows as get_bnz_rows
 from .router.BNZ import router as BNZRouter
 from .router.BNZ import save_data as save_bnz
 from .router.investnow import router as InvestnowRouter
+from .router.kernel_wealth import get_rows as get_kernel_rows
 from .router.kernel_wealth import router as KernelRouter
 from .router.kernel_wealth import save_data as save_kernel
+from .router.sharesies import get_rows as get_sharesies_rows
 from .router.sharesies import router as SharesiesRouter
 from .router.sharesies import save_data as save_sharesies
+from .router.simplicity import get_rows as get_simplicity_rows
 from .router.simplicity import router as SimplicityRouter
 from .router.simplicity import save_data as save_simplicity
+from .router.tenants import find_tenant, get_tenant, save_tenant
+from .router.tenants import get_rows as get_tenant_rows
+from .router.tenants import router as TenantsRouter
+from .router.transactions import router as TransactionsRouter
 from .router.utility import router as UtilityRouter
-from .utils.db import SavingsDB
+from .utils.analytics import portfolio_analytics
+from .utils.broadcast import broadcaster
+from .utils.dates import nz_today, shift_back
+from .utils.db import DEFAULT_TENANT, Resolution, SavingsRow
+from .utils.history_cache import history_cache
 from .utils.logger import MyLogger
+from .utils.profiling import ProfilingMiddleware
+from .utils.projection import MAX_CELLS, project
+from .utils.single_flight import single_flight
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=settings.gzip_minimum_size,
+    compresslevel=settings.gzip_level,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.cors_allow_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-History-Version", "X-Profile-Id"],
 )
 
 logger = MyLogger().get_logger()
-db_con = SavingsDB()
+db_con = history_cache
 
 app.include_router(ASBRouter, prefix="/asb")
 app.include_router(BNZRouter, prefix="/bnz")
@@ -37,17 +66,70 @@ app.include_router(KernelRouter, prefix="/kernel")
 app.include_router(SharesiesRouter, prefix="/sharesies")
 app.include_router(SimplicityRouter, prefix="/simplicity")
 app.include_router(InvestnowRouter, prefix="/investnow")
+app.include_router(TenantsRouter, prefix="/tenants")
+app.include_router(TransactionsRouter, prefix="/transactions")
 app.include_router(UtilityRouter, prefix="/utility")
 
+live_sources: list[Callable[[], list[SavingsRow]]] = [
+    get_asb_rows,
+    get_bnz_rows,
+    get_kernel_rows,
+    get_sharesies_rows,
+    get_simplicity_rows,
+]
+
+
+def fetch_source(get_rows: Callable[[], list[SavingsRow]]) -> list[SavingsRow]:
+    try:
+        return get_rows()
+    except Exception:
+        logger.exception(f"Failed to fetch live values from {get_rows.__module__}")
+        return []
+
+
+@single_flight
+def live_rows(tenant: str = DEFAULT_TENANT) -> list[SavingsRow]:
+    if tenant != DEFAULT_TENANT:
+        return get_tenant_rows(find_tenant(tenant))
+    with ThreadPoolExecutor(max_workers=len(live_sources)) as pool:
+        return [row for rows in pool.map(fetch_source, live_sources) for row in rows]
+
 
 @app.get("/portfolio")
-def portfolio_value() -> dict[str, dict | float | None]:
+def portfolio_value(
+    tenant: str = Depends(get_tenant),
+) -> dict[str, dict | float | None]:
     print("Getting portfolio value")
-    return db_con.current_portfolio()
+    return db_con.current_portfolio(tenant)
+
+
+@app.get("/portfolio/live")
+def live_portfolio(tenant: str = Depends(get_tenant)) -> dict[str, dict | float]:
+    print("Getting live portfolio value")
+    holdings: dict[str, dict[str, float]] = {}
+    for row in live_rows(tenant):
+        holdings.setdefault(row.platform, {})[row.account] = row.amount
+    total = sum(
+        amount for accounts in holdings.values() for amount in accounts.values()
+    )
+    return {"holdings": holdings, "total": round(total, 2)}
+
+
+@app.get("/portfolio/stream")
+async def portfolio_stream(tenant: str = Depends(get_tenant)) -> StreamingResponse:
+    """Server-sent events carrying each new snapshot and the refreshed portfolio."""
+    return StreamingResponse(
+        broadcaster.subscribe(tenant),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/portfolio")
-def save_portfolio() -> str:
+def save_portfolio(tenant: str = Depends(get_tenant)) -> str:
+    if tenant != DEFAULT_TENANT:
+        save_tenant(find_tenant(tenant))
+        return "Portfolio Updated"
     save_asb()
     save_bnz()
     save_kernel()
@@ -56,22 +138,229 @@ def save_portfolio() -> str:
     return "Portfolio Updated"
 
 
-@app.get("/history")
+# Calendar days, months or years of history to go back, up to a century each
+Days = Annotated[int, Query(ge=0, le=36500)]
+Months = Annotated[int, Query(ge=0, le=1200)]
+Years = Annotated[int, Query(ge=0, le=100)]
+
+# Earliest history window start, well inside what dates can be shifted through
+EARLIEST_START = date(1900, 1, 1)
+
+
+def history_window(
+    days: int, months: int, years: int, start: date | None, end: date | None
+) -> tuple[date, date]:
+    """Resolve the requested NZ date range.
+
+    ``end`` defaults to today and ``start`` to ``end`` minus the given calendar
+    years, months and days.
+    """
+    end = end or nz_today()
+    if start is None:
+        start = shift_back(end, days=days, months=months, years=years)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if start < EARLIEST_START:
+        raise HTTPException(
+            status_code=400, detail=f"start must not be before {EARLIEST_START}"
+        )
+    return start, end
+
+
+def trusted_json(content: object, response: Response | None = None) -> ORJSONResponse:
+    """Encode DataFrame output straight to JSON with orjson.
+
+    Its types are already known, so this skips FastAPI's validation against the
+    declared return type and its ``jsonable_encoder`` pass. An ``X-History-Version``
+    set on ``response`` is carried over.
+    """
+    headers = {}
+    if response is not None and "X-History-Version" in response.headers:
+        headers["X-History-Version"] = response.headers["X-History-Version"]
+    return ORJSONResponse(content, headers=headers)
+
+
+def changed_since(
+    response: Response,
+    since: date | None,
+    cursor: datetime | None,
+    tenant: str = DEFAULT_TENANT,
+) -> date | None:
+    """Set the history version header and work out the first day the client needs.
+
+    ``cursor`` is the ``X-History-Version`` a client received previously. Any day
+    with rows inserted after it (including backfilled corrections) is resent, along
+    with every later day since forward-filled values may have changed too.
+    """
+    version = db_con.history_version(tenant)
+    if version is not None:
+        response.headers["X-History-Version"] = version.isoformat()
+    if cursor is None:
+        return since
+    changed = db_con.first_changed_date(cursor, tenant)
+    if changed is None:
+        return date.max  # Nothing has changed since the client's version
+    return changed if since is None else max(since, changed)
+
+
+@app.get(
+    "/history", response_model=list[dict[str, float | str | date | datetime | None]]
+)
 def history(
-    days: int = 0, months: int = 0, years: int = 0
-) -> list[dict[str, float | str | date | None]]:
+    response: Response,
+    days: Days = 0,
+    months: Months = 0,
+    years: Years = 0,
+    start: date | None = None,
+    end: date | None = None,
+    since: date | None = None,
+    cursor: datetime | None = None,
+    resolution: Resolution = "day",
+    platform: Annotated[list[str] | None, Query()] = None,
+    account: Annotated[list[str] | None, Query()] = None,
+    tenant: str = Depends(get_tenant),
+) -> ORJSONResponse:
+    """Amounts per day (or hour), one column per investment.
+
+    Repeat ``platform`` or ``account`` to only include those.
+    """
     print("Getting portfolio history")
-    history_days = days + months * 30 + years * 365  # Not perfect, but fine
-    return db_con.get_history(history_days)
+    start, end = history_window(days, months, years, start, end)
+    since = changed_since(response, since, cursor, tenant)
+    if since == date.max:
+        return trusted_json([], response)
+    return trusted_json(
+        db_con.get_history(start, end, since, tenant, resolution, platform, account),
+        response,
+    )
 
 
-@app.get("/history/returns")
+@app.get("/history/returns", response_model=list[dict[str, float | str | date | None]])
 def history_returns(
-    days: int = 0, months: int = 0, years: int = 0
-) -> list[dict[str, float | str | date | None]]:
+    response: Response,
+    days: Days = 0,
+    months: Months = 0,
+    years: Years = 0,
+    start: date | None = None,
+    end: date | None = None,
+    since: date | None = None,
+    cursor: datetime | None = None,
+    platform: Annotated[list[str] | None, Query()] = None,
+    account: Annotated[list[str] | None, Query()] = None,
+    tenant: str = Depends(get_tenant),
+) -> ORJSONResponse:
     print("Getting portfolio returns history")
-    history_days = days + months * 30 + years * 365  # Not perfect, but fine
-    return db_con.get_history_percentage(history_days)
+    start, end = history_window(days, months, years, start, end)
+    since = changed_since(response, since, cursor, tenant)
+    if since == date.max:
+        return trusted_json([], response)
+    return trusted_json(
+        db_con.get_history_percentage(start, end, since, tenant, platform, account),
+        response,
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def cached_analytics(
+    start: date, end: date, window: int, version: datetime | None, tenant: str
+) -> dict[str, list | dict]:
+    # Keyed on the history version, so a day's results are reused until a new
+    # snapshot (or backfill) lands
+    return portfolio_analytics(
+        db_con.get_daily_amounts(start, end, tenant),
+        db_con.get_daily_flows(start, end, tenant),
+        window,
+    )
+
+
+@app.get("/history/analytics", response_model=dict[str, list | dict])
+def history_analytics(
+    days: Days = 0,
+    months: Months = 0,
+    years: Years = 0,
+    start: date | None = None,
+    end: date | None = None,
+    window: Annotated[int, Query(ge=2)] = 30,
+    tenant: str = Depends(get_tenant),
+) -> ORJSONResponse:
+    print("Getting portfolio analytics")
+    start, end = history_window(days, months, years, start, end)
+    return trusted_json(
+        cached_analytics(start, end, window, db_con.history_version(tenant), tenant)
+    )
+
+
+@app.get("/history/projection", response_model=dict[str, list | dict])
+def history_projection(
+    days: Days = 0,
+    months: Months = 0,
+    years: Years = 1,
+    start: date | None = None,
+    end: date | None = None,
+    horizon: int = 365,
+    paths: int = 2000,
+    contribution: float = 0,
+    seed: Annotated[int | None, Query(ge=0)] = None,
+    tenant: str = Depends(get_tenant),
+) -> ORJSONResponse:
+    """Percentile bands for ``horizon`` days ahead, resampling the chosen history.
+
+    ``contribution`` is a planned monthly deposit across the portfolio.
+    """
+    print("Projecting portfolio growth")
+    too_many = HTTPException(
+        status_code=400,
+        detail=f"horizon and paths must be positive, with at most {MAX_CELLS} "
+        "values across paths, days and platforms (plus the total)",
+    )
+    # Every projection has at least one platform and the total
+    if horizon < 1 or paths < 1 or horizon * paths * 2 > MAX_CELLS:
+        raise too_many
+    start, end = history_window(days, months, years, start, end)
+    daily = db_con.get_daily_amounts(start, end, tenant)
+    if horizon * paths * (daily["platform"].n_unique() + 1) > MAX_CELLS:
+        raise too_many
+    return trusted_json(
+        project(
+            daily,
+            db_con.get_daily_flows(start, end, tenant),
+            horizon,
+            paths,
+            contribution,
+            seed,
+        )
+    )
+
+
+@app.get(
+    "/history/{platform}/{account}",
+    response_model=list[dict[str, float | str | date | datetime | None]],
+)
+def account_history(
+    response: Response,
+    platform: str,
+    account: str,
+    days: Days = 0,
+    months: Months = 0,
+    years: Years = 0,
+    start: date | None = None,
+    end: date | None = None,
+    since: date | None = None,
+    cursor: datetime | None = None,
+    resolution: Resolution = "day",
+    tenant: str = Depends(get_tenant),
+) -> ORJSONResponse:
+    print(f"Getting history for {platform} - {account}")
+    start, end = history_window(days, months, years, start, end)
+    since = changed_since(response, since, cursor, tenant)
+    if since == date.max:
+        return trusted_json([], response)
+    return trusted_json(
+        db_con.get_account_history(
+            start, end, platform, account, since, tenant, resolution
+        ),
+        response,
+    )
 
 
 @app.get("/health")
@@ -7,5 +7,53 @@ class Settings(BaseSettings):
 
     debug: bool = False
 
+    # Seconds a live upstream balance is reused before fetching it again
+    live_cache_ttl: float = 30.0
+
+    # Only store a snapshot when an account's amount has changed
+    change_only_snapshots: bool = False
+
+    # Guards the /tenants admin routes, which are refused while it's unset
+    admin_token: str | None = None
+    # API key the default tenant must send, or unset to leave it open
+    default_tenant_key: str | None = None
+
+    # Tenants snapshotted at once by the scheduled fan-out
+    tenant_concurrency: int = 4
+
+    # Processes projections are split across, or 0 to run them in the request
+    projection_workers: int = 0
+
+    # Responses at least this many bytes are gzipped when the client accepts it
+    gzip_minimum_size: int = 1000
+    gzip_level: int = 6
+
+    # Local queue fetched snapshots are written to before Postgres, and how often
+    # (seconds) queued ones are retried
+    outbox_path: str = "outbox/snapshots.sqlite3"
+    outbox_flush_interval: int = 60
+
+    # Requests carrying this token (X-Profile header or profile query parameter) are
+    # profiled, as is a fraction of all others, at most profile_rate_limit a minute
+    # per worker. Unset or empty turns profiling off.
+    profile_token: str | None = None
+    profile_sample_rate: float = 0.0
+    profile_rate_limit: int = 6
+    # Seconds between stack samples, and where the newest profile_keep are saved
+    profile_interval: float = 0.005
+    # Sampling stops after this many seconds, so a slow request's profile can't
+    # grow without limit
+    profile_max_seconds: float = 30.0
+    profile_dir: str = "profiles"
+    profile_keep: int = 50
+
+    # Local directory the settled daily history of each tenant is cached in
+    history_cache_dir: str = "history_cache"
+
+    # Provider base URLs, overridable to point at a local stand-in
+    akahu_url: str = "https://api.akahu.io/v1"
+    investnow_login_url: str = "https://loginapi.adminis.co.nz"
+    investnow_api_url: str = "https://webapi.adminis.co.nz"
+
 
 settings = Settings()
@@ -1,15 +1,17 @@
-import os
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from datetime import datetime
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
 from ..API.ASB import Controller
 from ..utils.db import SavingsDB, SavingsRow
 from ..utils.logger import MyLogger
+from ..utils.outbox import save_rows
+from ..utils.scheduler import leader_only, save_schedule
+from .tenants import require_default_tenant
 
 logger = MyLogger().get_logger()
 
@@ -19,41 +21,35 @@ db_con = SavingsDB()
 tz = pytz.timezone("Pacific/Auckland")
 
 
+def get_rows() -> list[SavingsRow]:
+    rows = []
+    for account, get_value in (
+        ("6 month term deposit", con.get_6_month_value),
+        ("12 month term deposit", con.get_12_month_value),
+    ):
+        try:
+            rows.append(
+                SavingsRow(
+                    time=datetime.now(tz=pytz.timezone("UTC")),
+                    platform="ASB",
+                    account=account,
+                    amount=get_value(),
+                )
+            )
+        except Exception as e:  # NOQA
+            print(e)
+    return rows
+
+
 def save_data() -> None:
-    try:
-        td_6 = SavingsRow(
-            time=datetime.now(tz=pytz.timezone("UTC")),
-            platform="ASB",
-            account="6 month term deposit",
-            amount=con.get_6_month_value(),
-        )
-        db_con.insert(td_6)
-    except Exception as e:  # NOQA
-        print(e)
-    try:
-        td_12 = SavingsRow(
-            time=datetime.now(tz=pytz.timezone("UTC")),
-            platform="ASB",
-            account="12 month term deposit",
-            amount=con.get_12_month_value(),
-        )
-        db_con.insert(td_12)
-    except Exception as e:
-        print(e)
+    save_rows(get_rows())
 
 
 @asynccontextmanager
 async def lifespan(_: APIRouter) -> AsyncGenerator[None, None]:
     scheduler = BackgroundScheduler()
-    minute, hour, day, month, wday = os.environ["SAVE_TIME"].split(" ")
     scheduler.add_job(
-        save_data,
-        "cron",
-        minute=minute,
-        hour=hour,
-        day=day,
-        month=month,
-        day_of_week=wday,
+        leader_only("asb_save", save_data), "cron", **save_schedule("ASB")
     )
     scheduler.start()
     yield
@@ -62,6 +58,6 @@ async def lifespan(_: APIRouter) -> AsyncGenerator[None, None]:
 router = APIRouter(lifespan=lifespan)
 
 
-@router.get("/value")
-async def value() -> float:
+@router.get("/value", dependencies=[Depends(require_default_tenant)])
+def value() -> float:
     return con.get_account_value()
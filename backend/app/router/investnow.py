@@ -1,12 +1,14 @@
 from datetime import datetime
 
 import pytz
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
 
 from ..API.investnow import Controller
 from ..utils.db import SavingsDB, SavingsRow
 from ..utils.logger import MyLogger
+from ..utils.outbox import save_rows
+from .tenants import require_default_tenant
 
 
 class Token(BaseModel):
@@ -21,7 +23,7 @@ con = Controller()
 
 db_con = SavingsDB()
 
-@router.post("/save")
+@router.post("/save", dependencies=[Depends(require_default_tenant)])
 async def save_data(token: Token) -> None:
     portfolio = SavingsRow(
         time=datetime.now(tz=pytz.timezone('UTC')),
@@ -29,7 +31,7 @@ async def save_data(token: Token) -> None:
         account="Portfolio",
         amount=con.get_portfolio_value(token.token),
     )
-    db_con.insert(portfolio)
+    save_rows([portfolio])
 
 
 @router.post("/token")
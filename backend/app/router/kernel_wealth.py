@@ -1,15 +1,17 @@
-import os
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 from datetime import datetime
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
 
 from ..API.kernel_wealth import Controller
 from ..utils.db import SavingsDB, SavingsRow
 from ..utils.logger import MyLogger
+from ..utils.outbox import save_rows
+from ..utils.scheduler import leader_only, save_schedule
+from .tenants import require_default_tenant
 
 logger = MyLogger().get_logger()
 
@@ -19,7 +21,7 @@ db_con = SavingsDB()
 tz = pytz.timezone("Pacific/Auckland")
 
 
-def save_data() -> None:
+def get_rows() -> list[SavingsRow]:
     save = SavingsRow(
         time=datetime.now(tz=pytz.timezone("UTC")),
         platform="Kernel Wealth",
@@ -32,22 +34,18 @@ def save_data() -> None:
         account="Portfolio",
         amount=con.get_portfolio_value(),
     )
-    db_con.insert(save)
-    db_con.insert(portfolio)
+    return [save, portfolio]
+
+
+def save_data() -> None:
+    save_rows(get_rows())
 
 
 @asynccontextmanager
 async def lifespan(_: APIRouter) -> AsyncGenerator[None, None]:
     scheduler = BackgroundScheduler()
-    minute, hour, day, month, wday = os.environ["SAVE_TIME"].split(" ")
     scheduler.add_job(
-        save_data,
-        "cron",
-        minute=minute,
-        hour=hour,
-        day=day,
-        month=month,
-        day_of_week=wday,
+        leader_only("kernel_save", save_data), "cron", **save_schedule("KERNEL")
     )
     scheduler.start()
     yield
@@ -56,6 +54,6 @@ async def lifespan(_: APIRouter) -> AsyncGenerator[None, None]:
 router = APIRouter(lifespan=lifespan)
 
 
-@router.get("/value")
-async def value() -> float:
+@router.get("/value", dependencies=[Depends(require_default_tenant)])
+def value() -> float:
     return con.get_account_value()
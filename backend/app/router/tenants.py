@@ -0,0 +1,210 @@
+import hashlib
+import secrets
+from collections.abc import AsyncGenerator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Annotated
+
+import pytz
+from apscheduler.schedulers.background import BackgroundScheduler
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from ..API.akahu import Controller
+from ..config import settings
+from ..utils.db import DEFAULT_TENANT, SavingsDB, SavingsRow, Tenant, TenantAccount
+from ..utils.logger import MyLogger
+from ..utils.outbox import save_rows
+from ..utils.scheduler import leader_only, save_schedule
+
+logger = MyLogger().get_logger()
+
+db_con = SavingsDB()
+tz = pytz.timezone("Pacific/Auckland")
+
+# One client per tenant and credentials, so a rotated token gets a fresh client
+# and each client's single-flight cache only holds that tenant's balances
+controllers: dict[tuple[str, str, str], Controller] = {}
+
+
+def hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def matches(given: str | None, secret: str | None) -> bool:
+    return bool(secret) and secrets.compare_digest(given or "", secret)
+
+
+def authenticated(tenant: str, api_key: str | None) -> bool:
+    """Whether ``api_key`` is the key issued to ``tenant``."""
+    stored = db_con.tenant_key_hash(tenant)
+    return api_key is not None and matches(hash_key(api_key), stored)
+
+
+def get_tenant(
+    x_tenant: Annotated[str | None, Header()] = None,
+    tenant: str | None = None,
+    x_api_key: Annotated[str | None, Header()] = None,
+    api_key: str | None = None,
+) -> str:
+    """Tenant a request is for, from ``X-Tenant`` or a ``tenant`` query parameter.
+
+    Any tenant but the default must send its key in ``X-API-Key`` or an
+    ``api_key`` query parameter, and the default only needs one when
+    ``default_tenant_key`` is set. The query parameters are for ``EventSource``,
+    which can't set headers.
+    """
+    name = x_tenant or tenant or DEFAULT_TENANT
+    key = x_api_key or api_key
+    if name == DEFAULT_TENANT:
+        if settings.default_tenant_key and not matches(
+            key, settings.default_tenant_key
+        ):
+            raise HTTPException(status_code=401, detail="Invalid API key")
+        return name
+    if not authenticated(name, key):
+        # Same answer for unknown tenants, so names can't be probed
+        raise HTTPException(status_code=401, detail="Invalid tenant or API key")
+    return name
+
+
+def require_default_tenant(tenant: Annotated[str, Depends(get_tenant)]) -> None:
+    """Allow only the default tenant, whose providers are set in the environment."""
+    if tenant != DEFAULT_TENANT:
+        raise HTTPException(
+            status_code=403, detail="Only available to the default tenant"
+        )
+
+
+def require_admin(x_admin_token: Annotated[str | None, Header()] = None) -> None:
+    if not matches(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def require_tenant_or_admin(
+    tenant: str,
+    x_api_key: Annotated[str | None, Header()] = None,
+    x_admin_token: Annotated[str | None, Header()] = None,
+) -> None:
+    """Allow the tenant named in the path, or an admin."""
+    if not matches(x_admin_token, settings.admin_token) and not authenticated(
+        tenant, x_api_key
+    ):
+        raise HTTPException(status_code=403, detail="Tenant API key required")
+
+
+def find_tenant(name: str) -> Tenant:
+    tenant = db_con.get_tenant(name)
+    if tenant is None:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant {name}")
+    return tenant
+
+
+def tenant_controller(tenant: Tenant) -> Controller:
+    key = (tenant.tenant, tenant.akahu_id, tenant.auth_token)
+    if key not in controllers:
+        controllers[key] = Controller(tenant.akahu_id, tenant.auth_token)
+    return controllers[key]
+
+
+def get_rows(tenant: Tenant) -> list[SavingsRow]:
+    con = tenant_controller(tenant)
+    rows = []
+    for account in db_con.get_accounts(tenant.tenant):
+        try:
+            amount = con.get_balance(account.akahu_account_id, account.balance_field)
+        except Exception:
+            logger.exception(
+                f"Failed to fetch balance of {account.platform}/{account.account} "
+                f"for tenant {tenant.tenant}"
+            )
+            continue
+        rows.append(
+            SavingsRow(
+                time=datetime.now(tz=pytz.timezone("UTC")),
+                platform=account.platform,
+                account=account.account,
+                amount=amount,
+                tenant=tenant.tenant,
+            )
+        )
+    return rows
+
+
+def save_tenant(tenant: Tenant) -> int:
+    try:
+        rows = get_rows(tenant)
+        save_rows(rows)
+    except Exception:
+        logger.exception(f"Failed to save snapshot for tenant {tenant.tenant}")
+        return 0
+    return len(rows)
+
+
+def save_data() -> int:
+    """Snapshot every registered tenant, a few at a time."""
+    with ThreadPoolExecutor(max_workers=settings.tenant_concurrency) as pool:
+        return sum(pool.map(save_tenant, db_con.get_tenants()))
+
+
+@asynccontextmanager
+async def lifespan(_: APIRouter) -> AsyncGenerator[None, None]:
+    scheduler = BackgroundScheduler()
+    scheduler.add_job(
+        leader_only("tenants_save", save_data), "cron", **save_schedule("TENANTS")
+    )
+    scheduler.start()
+    yield
+
+
+router = APIRouter(lifespan=lifespan)
+
+
+@router.get("", dependencies=[Depends(require_admin)])
+def tenants() -> list[str]:
+    return [tenant.tenant for tenant in db_con.get_tenants()]
+
+
+@router.post("", dependencies=[Depends(require_admin)])
+def add_tenant(
+    tenant: Tenant, x_api_key: Annotated[str | None, Header()] = None
+) -> dict[str, str]:
+    """Register a tenant and issue its API key, which is only shown this once.
+
+    An existing tenant's Akahu credentials are only replaced when the request also
+    carries that tenant's key.
+    """
+    if tenant.tenant == DEFAULT_TENANT:
+        raise HTTPException(
+            status_code=400, detail=f"{DEFAULT_TENANT} is configured by environment"
+        )
+    api_key = secrets.token_urlsafe(32)
+    if db_con.create_tenant(tenant, hash_key(api_key)):
+        return {"tenant": tenant.tenant, "api_key": api_key}
+    if not authenticated(tenant.tenant, x_api_key):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Tenant {tenant.tenant} exists, send its API key to update it",
+        )
+    db_con.update_tenant(tenant)
+    return {"tenant": tenant.tenant}
+
+
+@router.post("/{tenant}/key", dependencies=[Depends(require_admin)])
+def issue_key(tenant: str) -> dict[str, str]:
+    """Replace a tenant's API key, e.g. for one added before keys existed."""
+    api_key = secrets.token_urlsafe(32)
+    if not db_con.set_tenant_key(tenant, hash_key(api_key)):
+        raise HTTPException(status_code=404, detail=f"Unknown tenant {tenant}")
+    return {"tenant": tenant, "api_key": api_key}
+
+
+@router.get("/{tenant}/accounts", dependencies=[Depends(require_tenant_or_admin)])
+def accounts(tenant: str) -> list[TenantAccount]:
+    return db_con.get_accounts(find_tenant(tenant).tenant)
+
+
+@router.post("/{tenant}/accounts", dependencies=[Depends(require_tenant_or_admin)])
+def add_account(tenant: str, account: TenantAccount) -> str:
+    db_con.upsert_account(find_tenant(tenant).tenant, account)
+    return "Account Updated"
@@ -0,0 +1,111 @@
+import os
+from collections.abc import AsyncGenerator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+import pytz
+from apscheduler.schedulers.background import BackgroundScheduler
+from fastapi import APIRouter, Depends
+
+from ..API.akahu import ACCOUNTS, Controller
+from ..config import settings
+from ..utils.db import DEFAULT_TENANT, SavingsDB, Tenant, TransactionRow
+from ..utils.logger import MyLogger
+from ..utils.scheduler import leader_only
+from .tenants import require_admin, tenant_controller
+
+logger = MyLogger().get_logger()
+
+con = Controller()
+
+db_con = SavingsDB()
+tz = pytz.timezone("Pacific/Auckland")
+
+# Re-fetch a little before the newest stored transaction, since transactions can
+# settle a few days after they are dated. Duplicates are ignored on insert.
+OVERLAP = timedelta(days=7)
+
+
+def sync_accounts(
+    client: Controller,
+    accounts: list[tuple[str, str, str]],
+    tenant: str = DEFAULT_TENANT,
+) -> int:
+    """Fetch and store new transactions for (platform, account, Akahu ID) tuples."""
+    latest = db_con.latest_transaction_times(tenant)
+    saved = 0
+    for platform, account, account_id in accounts:
+        since = latest.get((platform, account))
+        try:
+            items = client.get_transactions(
+                account_id, None if since is None else since - OVERLAP
+            )
+        except Exception:
+            logger.exception(
+                f"Failed to fetch transactions of {platform}/{account} "
+                f"for tenant {tenant}"
+            )
+            continue
+        rows = [
+            TransactionRow(
+                time=datetime.fromisoformat(item["date"]),
+                platform=platform,
+                account=account,
+                transaction_id=item["_id"],
+                amount=item["amount"],
+                type=item.get("type", ""),
+                description=item.get("description", ""),
+                tenant=tenant,
+            )
+            for item in items
+        ]
+        saved += db_con.insert_transactions(rows)
+    return saved
+
+
+def sync_tenant(tenant: Tenant) -> int:
+    accounts = [
+        (account.platform, account.account, account.akahu_account_id)
+        for account in db_con.get_accounts(tenant.tenant)
+    ]
+    try:
+        return sync_accounts(tenant_controller(tenant), accounts, tenant.tenant)
+    except Exception:
+        logger.exception(f"Failed to sync transactions for tenant {tenant.tenant}")
+        return 0
+
+
+def save_data() -> int:
+    saved = sync_accounts(
+        con,
+        [(platform, account, os.environ[var]) for platform, account, var in ACCOUNTS],
+    )
+    with ThreadPoolExecutor(max_workers=settings.tenant_concurrency) as pool:
+        return saved + sum(pool.map(sync_tenant, db_con.get_tenants()))
+
+
+@asynccontextmanager
+async def lifespan(_: APIRouter) -> AsyncGenerator[None, None]:
+    scheduler = BackgroundScheduler()
+    minute, hour, day, month, wday = os.environ["SAVE_TIME"].split(" ")
+    scheduler.add_job(
+        leader_only("transactions_sync", save_data),
+        "cron",
+        minute=minute,
+        hour=hour,
+        day=day,
+        month=month,
+        day_of_week=wday,
+    )
+    scheduler.start()
+    yield
+
+
+router = APIRouter(lifespan=lifespan)
+
+
+@router.post("/sync", dependencies=[Depends(require_admin)])
+def sync() -> int:
+    print("Syncing transactions")
+    return save_data()
@@ -1,14 +1,21 @@
+import json
 import os
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
 
 from ..API.simplicity import Controller
+from ..config import settings
 from ..utils.db import SavingsDB
 from ..utils.logger import MyLogger
+from ..utils.outbox import flush_outbox, outbox
+from ..utils.profiling import authorised, list_profiles
+from ..utils.scheduler import leader_only
+from .tenants import require_admin
 
 logger = MyLogger().get_logger()
 
@@ -23,7 +30,7 @@ async def lifespan(_: APIRouter) -> AsyncGenerator[None, None]:
     scheduler = BackgroundScheduler()
     minute, hour, day, month, wday = os.environ["SAVE_TIME"].split(" ")
     scheduler.add_job(
-        db_con.identify_expired,
+        leader_only("identify_expired", db_con.identify_expired),
         "cron",
         minute=minute,
         hour=hour,
@@ -31,6 +38,8 @@ async def lifespan(_: APIRouter) -> AsyncGenerator[None, None]:
         month=month,
         day_of_week=wday,
     )
+    # Every worker retries the outbox, batches are claimed so each is written once
+    scheduler.add_job(flush_outbox, "interval", seconds=settings.outbox_flush_interval)
     scheduler.start()
     yield
 
@@ -38,7 +47,72 @@ async def lifespan(_: APIRouter) -> AsyncGenerator[None, None]:
 router = APIRouter(lifespan=lifespan)
 
 
-@router.get("/expired")
+@router.get("/expired", dependencies=[Depends(require_admin)])
 async def expired() -> None:
     print("Accounting for expired investments")
     return db_con.identify_expired()
+
+
+@router.post("/compact", dependencies=[Depends(require_admin)])
+def compact() -> int:
+    print("Removing unchanged snapshots")
+    return db_con.compact()
+
+
+@router.get("/outbox", dependencies=[Depends(require_admin)])
+def outbox_pending() -> int:
+    return outbox.pending()
+
+
+@router.post("/outbox/flush", dependencies=[Depends(require_admin)])
+def outbox_flush() -> int:
+    print("Flushing snapshot outbox")
+    return flush_outbox()
+
+
+def require_profile_token(
+    x_profile: str | None = Header(None), profile: str | None = None
+) -> None:
+    if not authorised(x_profile or profile):
+        raise HTTPException(status_code=403, detail="Profiling token required")
+
+
+def profile_file(profile_id: str, suffix: str) -> str:
+    if profile_id not in list_profiles(settings.profile_dir):
+        raise HTTPException(status_code=404, detail=f"Unknown profile {profile_id}")
+    return os.path.join(settings.profile_dir, profile_id + suffix)
+
+
+@router.get("/profiles", dependencies=[Depends(require_profile_token)])
+def profiles(limit: int = 20) -> list[dict]:
+    """Newest saved request profiles, without their SQL and Polars details."""
+    summaries = []
+    for profile_id in list_profiles(settings.profile_dir)[:limit]:
+        with open(profile_file(profile_id, ".json")) as file:
+            summary = json.load(file)
+        summaries.append(
+            {
+                key: value
+                for key, value in summary.items()
+                if key not in ("sql", "polars")
+            }
+        )
+    return summaries
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_profile_token)])
+def profile_detail(profile_id: str) -> FileResponse:
+    """A profile's timings, with each SQL statement and Polars stage."""
+    return FileResponse(
+        profile_file(profile_id, ".json"), media_type="application/json"
+    )
+
+
+@router.get(
+    "/profiles/{profile_id}/flamegraph",
+    dependencies=[Depends(require_profile_token)],
+    response_class=PlainTextResponse,
+)
+def profile_flamegraph(profile_id: str) -> FileResponse:
+    """Sampled stacks in the folded format ``flamegraph.pl`` and speedscope read."""
+    return FileResponse(profile_file(profile_id, ".folded"), media_type="text/plain")
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import select
+import threading
+import time
+from collections.abc import AsyncGenerator
+
+import pytz
+from fastapi.encoders import jsonable_encoder
+from psycopg2 import sql
+
+from .db import DEFAULT_TENANT, SavingsDB, SavingsRow
+from .logger import MyLogger
+
+# Longest payload pg_notify accepts, in bytes
+MAX_PAYLOAD = 7999
+
+
+class Broadcaster:
+    """Fan server-sent events out to every connected client, across workers.
+
+    Events travel through Postgres ``NOTIFY``, so a snapshot saved by whichever
+    worker ran the job reaches clients connected to any worker. Each process
+    ``LISTEN``s on a background thread, started with its first subscriber, and hands
+    messages to each subscriber's event loop. Slow clients drop their oldest queued
+    message rather than blocking delivery. Events are tagged with a tenant and only
+    reach that tenant's subscribers.
+    """
+
+    def __init__(self, db: SavingsDB, channel: str, max_queue: int = 100) -> None:
+        self.db = db
+        self.channel = channel
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._listener: threading.Thread | None = None
+        self._subscribers: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue, str]] = (
+            set()
+        )
+
+    def encode(self, event: str, data: object, tenant: str = DEFAULT_TENANT) -> str:
+        return json.dumps(
+            {"event": event, "data": jsonable_encoder(data), "tenant": tenant}
+        )
+
+    def publish(self, event: str, data: object, tenant: str = DEFAULT_TENANT) -> None:
+        self.db.notify(self.channel, self.encode(event, data, tenant))
+
+    def _deliver(self, payload: str) -> None:
+        event = json.loads(payload)
+        message = f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+        with self._lock:
+            subscribers = [
+                (loop, queue)
+                for loop, queue, tenant in self._subscribers
+                if tenant == event.get("tenant", DEFAULT_TENANT)
+            ]
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, message)
+            except RuntimeError:  # Subscriber's loop has already closed
+                continue
+
+    def _offer(self, queue: asyncio.Queue, message: str) -> None:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(message)
+
+    def _listen(self) -> None:
+        while True:
+            conn = None
+            try:
+                conn = self.db.get_connection()
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(
+                        sql.SQL("LISTEN {}").format(sql.Identifier(self.channel))
+                    )
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._deliver(conn.notifies.pop(0).payload)
+            except Exception:
+                logger.exception("Event listener connection lost, reconnecting")
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _ensure_listening(self) -> None:
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, daemon=True)
+                self._listener.start()
+
+    async def subscribe(
+        self, tenant: str = DEFAULT_TENANT, keepalive: float = 15
+    ) -> AsyncGenerator[str, None]:
+        self._ensure_listening()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        subscriber = (asyncio.get_running_loop(), queue, tenant)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=keepalive)
+                except TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+
+logger = MyLogger().get_logger()
+db_con = SavingsDB()
+broadcaster = Broadcaster(db_con, "savings_events")
+tz = pytz.timezone("Pacific/Auckland")
+
+
+def snapshot_events(rows: list[SavingsRow], tenant: str) -> list[list[dict]]:
+    """``rows`` shaped like ``/history`` rows, split across as many events as it
+    takes to keep each under ``MAX_PAYLOAD``.
+
+    A day's amounts can be split between events, which clients merge by date.
+    """
+    events: list[dict] = [{}]
+    for row in sorted(rows, key=lambda row: row.time):
+        nz_date = row.time.astimezone(tz).date()
+        series = f"{row.platform} - {row.account}"
+        history = events[-1]
+        day = history.setdefault(nz_date, {"nz_date": nz_date})
+        day[series] = row.amount
+        if len(day) > 2 or len(history) > 1:
+            encoded = broadcaster.encode("snapshot", list(history.values()), tenant)
+            if len(encoded) > MAX_PAYLOAD:
+                del day[series]
+                if len(day) == 1:
+                    del history[nz_date]
+                events.append({nz_date: {"nz_date": nz_date, series: row.amount}})
+    return [list(history.values()) for history in events]
+
+
+def publish_snapshot(rows: list[SavingsRow]) -> None:
+    """Push newly saved rows, shaped like ``/history`` rows, and refreshed metrics."""
+    if not rows:
+        return
+    tenant = rows[0].tenant
+    try:
+        for history in snapshot_events(rows, tenant):
+            broadcaster.publish("snapshot", history, tenant)
+    except Exception:
+        logger.exception("Failed to publish new snapshot")
+    try:
+        broadcaster.publish("portfolio", db_con.current_portfolio(tenant), tenant)
+    except Exception:
+        logger.exception("Failed to publish refreshed portfolio")
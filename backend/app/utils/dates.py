@@ -0,0 +1,20 @@
+import datetime
+
+import polars as pl
+import pytz
+
+tz = pytz.timezone("Pacific/Auckland")
+
+
+def nz_today() -> datetime.date:
+    return datetime.datetime.now(tz=tz).date()
+
+
+def shift_back(
+    end: datetime.date, days: int = 0, months: int = 0, years: int = 0
+) -> datetime.date:
+    """Step back from ``end`` by whole calendar years, months and days.
+
+    Month ends are clamped, so one month before 31 March is the end of February.
+    """
+    return pl.Series([end]).dt.offset_by(f"-{years}y{months}mo{days}d").item()
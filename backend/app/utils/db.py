@@ -1,20 +1,85 @@
 import datetime
+import io
 import os
 from pprint import pprint
-from typing import Any
+from typing import Any, Literal
 
 import polars as pl
 import psycopg2
 import pytz
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
 from pydantic import BaseModel
 
+from ..config import settings
+from .profiling import TimedConnection, current, stage
+
+# Akahu transaction types that are growth rather than money moved in or out
+NON_FLOW_TYPES = ("INTEREST", "FEE", "TAX")
+
+# Rollup history is read from at each resolution, and its bucket width
+Resolution = Literal["hour", "day"]
+ROLLUPS: dict[str, tuple[str, str]] = {
+    "hour": ("savings_hourly", "1 hour"),
+    "day": ("savings_daily", "1 day"),
+}
+
+# Rollups in refresh order, each with its refresh policy's end offset
+ROLLUP_POLICIES = (
+    ("savings_hourly", datetime.timedelta(hours=1)),
+    ("savings_daily", datetime.timedelta(days=1)),
+)
+
+# Tenant owning the accounts and credentials configured through the environment
+DEFAULT_TENANT = "default"
+
+
+def series_filter(platforms: list[str] | None, accounts: list[str] | None) -> sql.SQL:
+    """``AND`` clauses limiting a query to the given platforms and accounts.
+
+    Matching ``%(platforms)s`` and ``%(accounts)s`` parameters are expected. Both
+    columns come straight after ``tenant`` in the rollups' and transactions'
+    indexes, so they narrow the index scan. Transactions are also segmented by
+    tenant and platform, so compressed chunks skip other platforms' segments.
+    """
+    clauses = []
+    if platforms:
+        clauses.append("AND platform = ANY(%(platforms)s)")
+    if accounts:
+        clauses.append("AND account = ANY(%(accounts)s)")
+    return sql.SQL(" ".join(clauses))
+
 
 class SavingsRow(BaseModel):
     time: datetime.datetime
     platform: str
     account: str
     amount: float
+    tenant: str = DEFAULT_TENANT
+
+
+class TransactionRow(BaseModel):
+    time: datetime.datetime
+    platform: str
+    account: str
+    transaction_id: str
+    amount: float
+    type: str
+    description: str
+    tenant: str = DEFAULT_TENANT
+
+
+class Tenant(BaseModel):
+    tenant: str
+    akahu_id: str
+    auth_token: str
+
+
+class TenantAccount(BaseModel):
+    platform: str
+    account: str
+    akahu_account_id: str
+    balance_field: str = "current"
 
 
 class SavingsDB:
@@ -36,207 +101,782 @@ class SavingsDB:
 
     def get_connection(self) -> Any:  # NOQA
         """Get database connection."""
+        if current() is not None:
+            # Time each statement for the request being profiled
+            return psycopg2.connect(
+                **self.connection_params, connection_factory=TimedConnection
+            )
         return psycopg2.connect(**self.connection_params)  # pyright: ignore
 
+    def read_frame(
+        self, query: str, params: dict | tuple, schema: dict[str, pl.DataType]
+    ) -> pl.DataFrame:
+        """Run a query and load the result straight into Polars columns.
+
+        Rows are streamed with ``COPY ... TO STDOUT`` and parsed by Polars against
+        ``schema``, skipping the per-row dicts ``RealDictCursor`` would build and
+        Polars' type inference over them.
+        """
+        buffer = io.BytesIO()
+        with self.get_connection() as conn, conn.cursor() as cur:
+            query = cur.mogrify(query, params).decode()
+            cur.copy_expert(
+                f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer
+            )
+        buffer.seek(0)
+        with stage("read_csv"):
+            return pl.read_csv(buffer, schema=schema)
+
     def insert(self, item: SavingsRow) -> None:
+        self.insert_many([item])
+
+    def insert_many(self, items: list[SavingsRow]) -> None:
+        """Save snapshots and record that their accounts were seen.
+
+        Rows already stored for the same account and time are skipped, so a batch can
+        be retried safely. With ``change_only_snapshots`` a row is also skipped when
+        it matches the account's previous amount. Readers carry the last value
+        forward, so history is unaffected, and the heartbeat keeps the account from
+        looking expired.
+        """
+        items = sorted(items, key=lambda item: item.time)
+        last_seen = {
+            (item.tenant, item.platform, item.account): item.time for item in items
+        }
+        if settings.change_only_snapshots:
+            # Repeats within the batch are dropped here, repeats of stored rows in SQL
+            previous: dict[tuple[str, str, str], float] = {}
+            changed = []
+            for item in items:
+                key = (item.tenant, item.platform, item.account)
+                if previous.get(key) != item.amount:
+                    changed.append(item)
+                previous[key] = item.amount
+            items = changed
+        if not last_seen:
+            return
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            execute_values(
+                cur,
+                sql.SQL(
+                    """
+INSERT INTO savings (time, platform, account, amount, tenant)
+SELECT batch.time, batch.platform, batch.account, batch.amount, batch.tenant
+FROM (VALUES %s) AS batch (time, platform, account, amount, tenant)
+WHERE NOT EXISTS (
+    SELECT 1
+    FROM savings
+    WHERE tenant = batch.tenant
+        AND platform = batch.platform
+        AND account = batch.account
+        AND time = batch.time
+)
+{change_only}
+                    """
+                ).format(
+                    change_only=sql.SQL(
+                        """
+AND batch.amount IS DISTINCT FROM COALESCE(
+    (
+        SELECT amount
+        FROM savings
+        WHERE tenant = batch.tenant
+            AND platform = batch.platform
+            AND account = batch.account
+            AND time <= batch.time
+        ORDER BY time DESC
+        LIMIT 1
+    ),
+    -- An account unchanged for longer than raw retention only has its rollup
+    (
+        SELECT amount
+        FROM savings_daily
+        WHERE tenant = batch.tenant
+            AND platform = batch.platform
+            AND account = batch.account
+            AND time <= batch.time
+        ORDER BY bucket DESC
+        LIMIT 1
+    )
+)
+                        """
+                        if settings.change_only_snapshots
+                        else ""
+                    )
+                ),
+                [
+                    (item.time, item.platform, item.account, item.amount, item.tenant)
+                    for item in items
+                ],
+                template="(%s::timestamptz, %s, %s, %s::double precision, %s)",
+                page_size=500,
+            )
+            execute_values(
+                cur,
+                """
+                    INSERT INTO account_heartbeats (tenant, platform, account, last_seen)
+                    VALUES %s
+                    ON CONFLICT (tenant, platform, account) DO UPDATE
+                    SET last_seen = GREATEST(
+                        account_heartbeats.last_seen, EXCLUDED.last_seen
+                    )
+                """,
+                [(*key, time) for key, time in last_seen.items()],
+            )
+            conn.commit()
+        if items:
+            self.refresh_rollups(items[0].time)
+
+    def refresh_rollups(self, since: datetime.datetime) -> None:
+        """Materialise snapshots from ``since`` onwards into the rollups.
+
+        Rows written behind a rollup's refresh watermark, like backfills and late
+        outbox flushes, don't show in it until its policy next runs, or ever when
+        they're older than the policy's window. The history version moves as soon
+        as they're written, so they're refreshed straight away instead.
+        """
+        now = datetime.datetime.now(tz=datetime.UTC)
+        stale = [
+            (view, since - offset, now - offset)
+            for view, offset in ROLLUP_POLICIES
+            if since < now - offset
+        ]
+        if not stale:
+            return
+        conn = self.get_connection()
+        try:
+            # Refreshing can't happen inside a transaction
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                for view, start, end in stale:
+                    cur.execute(
+                        "CALL refresh_continuous_aggregate(%s, %s, %s)",
+                        (view, start, end),
+                    )
+        finally:
+            conn.close()
+
+    def compact(self) -> int:
+        """Delete snapshots that repeat their account's previous amount.
+
+        Brings rows saved before ``change_only_snapshots`` was turned on in line with
+        it. Each account's latest snapshot time is kept as its heartbeat first.
+
+        :return: Number of rows deleted
+        """
         with (
             self.get_connection() as conn,
             conn.cursor(cursor_factory=RealDictCursor) as cur,
         ):
             cur.execute(
                 """
-                    INSERT INTO savings (time, platform, account, amount)
+INSERT INTO account_heartbeats (tenant, platform, account, last_seen)
+SELECT tenant, platform, account, MAX(time)
+FROM savings
+GROUP BY tenant, platform, account
+ON CONFLICT (tenant, platform, account) DO UPDATE
+SET last_seen = GREATEST(account_heartbeats.last_seen, EXCLUDED.last_seen)
+                """
+            )
+            cur.execute(
+                """
+DELETE FROM savings s
+USING (
+    SELECT tenant, platform, account, time
+    FROM (
+        SELECT
+            tenant,
+            platform,
+            account,
+            time,
+            amount,
+            LAG(amount) OVER (
+                PARTITION BY tenant, platform, account ORDER BY time
+            ) AS previous
+        FROM savings
+    ) ordered
+    WHERE amount = previous
+) repeated
+WHERE s.tenant = repeated.tenant
+    AND s.platform = repeated.platform
+    AND s.account = repeated.account
+    AND s.time = repeated.time
+                """
+            )
+            conn.commit()
+            return cur.rowcount
+
+    def insert_transactions(self, items: list[TransactionRow]) -> int:
+        """Bulk insert transactions, skipping any already stored.
+
+        :return: Number of new transactions
+        """
+        if not items:
+            return 0
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            inserted = execute_values(
+                cur,
+                """
+                    INSERT INTO transactions
+                        (time, platform, account, transaction_id, amount, type,
+                        description, tenant)
+                    VALUES %s
+                    ON CONFLICT (transaction_id, time) DO NOTHING
+                    RETURNING transaction_id
+                """,
+                [
+                    (
+                        item.time,
+                        item.platform,
+                        item.account,
+                        item.transaction_id,
+                        item.amount,
+                        item.type,
+                        item.description,
+                        item.tenant,
+                    )
+                    for item in items
+                ],
+                page_size=500,
+                fetch=True,
+            )
+            conn.commit()
+            return len(inserted)
+
+    def latest_transaction_times(
+        self, tenant: str = DEFAULT_TENANT
+    ) -> dict[tuple[str, str], datetime.datetime]:
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            cur.execute(
+                """
+SELECT platform, account, MAX(time) AS time
+FROM transactions
+WHERE tenant = %s
+GROUP BY platform, account
+                """,
+                (tenant,),
+            )
+            return {(row["platform"], row["account"]): row["time"] for row in cur}
+
+    def create_tenant(self, item: Tenant, api_key_hash: str) -> bool:
+        """Add a tenant, unless one by that name already exists.
+
+        :return: Whether it was created
+        """
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            cur.execute(
+                """
+                    INSERT INTO tenants (tenant, akahu_id, auth_token, api_key_hash)
                     VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (tenant) DO NOTHING
                 """,
-                (item.time, item.platform, item.account, item.amount),
+                (item.tenant, item.akahu_id, item.auth_token, api_key_hash),
             )
             conn.commit()
+            return cur.rowcount == 1
 
-    def current_portfolio(self) -> dict[str, (None, dict)]:
-        # Pacific/Auckland timezone
-        now_nz = datetime.datetime.now(tz=pytz.timezone("Pacific/Auckland"))
+    def update_tenant(self, item: Tenant) -> None:
+        """Replace a tenant's Akahu credentials, keeping its API key."""
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            cur.execute(
+                "UPDATE tenants SET akahu_id = %s, auth_token = %s WHERE tenant = %s",
+                (item.akahu_id, item.auth_token, item.tenant),
+            )
+            conn.commit()
 
+    def set_tenant_key(self, tenant: str, api_key_hash: str) -> bool:
+        """Replace a tenant's API key.
+
+        :return: Whether the tenant exists
+        """
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            cur.execute(
+                "UPDATE tenants SET api_key_hash = %s WHERE tenant = %s",
+                (api_key_hash, tenant),
+            )
+            conn.commit()
+            return cur.rowcount == 1
+
+    def tenant_key_hash(self, tenant: str) -> str | None:
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            cur.execute("SELECT api_key_hash FROM tenants WHERE tenant = %s", (tenant,))
+            row = cur.fetchone()
+            return row["api_key_hash"] if row else None
+
+    def get_tenant(self, tenant: str) -> Tenant | None:
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            cur.execute(
+                "SELECT tenant, akahu_id, auth_token FROM tenants WHERE tenant = %s",
+                (tenant,),
+            )
+            row = cur.fetchone()
+            return Tenant(**row) if row else None
+
+    def get_tenants(self) -> list[Tenant]:
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            cur.execute("SELECT tenant, akahu_id, auth_token FROM tenants ORDER BY 1")
+            return [Tenant(**row) for row in cur]
+
+    def upsert_account(self, tenant: str, item: TenantAccount) -> None:
         with (
             self.get_connection() as conn,
             conn.cursor(cursor_factory=RealDictCursor) as cur,
         ):
-            # Get latest for each account/platform for today and yesterday (NZ time)
             cur.execute(
                 """
-WITH latest_per_day AS (
-    SELECT
-        *,
-        ROW_NUMBER() OVER (
-            PARTITION BY account, platform, timezone('Pacific/Auckland', time)::date
-            ORDER BY time DESC
-        ) AS rn,
-        timezone('Pacific/Auckland', time)::date AS nz_date
-    FROM savings
-),
-daily_totals AS (
+                    INSERT INTO accounts
+                        (tenant, platform, account, akahu_account_id, balance_field)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (tenant, platform, account) DO UPDATE
+                    SET akahu_account_id = EXCLUDED.akahu_account_id,
+                        balance_field = EXCLUDED.balance_field
+                """,
+                (
+                    tenant,
+                    item.platform,
+                    item.account,
+                    item.akahu_account_id,
+                    item.balance_field,
+                ),
+            )
+            conn.commit()
+
+    def get_accounts(self, tenant: str) -> list[TenantAccount]:
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            cur.execute(
+                """
+SELECT platform, account, akahu_account_id, balance_field
+FROM accounts
+WHERE tenant = %s
+ORDER BY platform, account
+                """,
+                (tenant,),
+            )
+            return [TenantAccount(**row) for row in cur]
+
+    def notify(self, channel: str, payload: str) -> None:
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+            conn.commit()
+
+    def current_portfolio(
+        self, tenant: str = DEFAULT_TENANT
+    ) -> dict[str, (None, dict)]:
+        # Pacific/Auckland timezone
+        now_nz = datetime.datetime.now(tz=pytz.timezone("Pacific/Auckland"))
+
+        # Get latest for each account/platform for each day (NZ time)
+        data = self.read_frame(
+            """
+WITH daily_totals AS (
     SELECT
         platform,
         account,
         amount,
-        nz_date,
-        %s::date - nz_date AS days_ago
-    FROM latest_per_day
-    WHERE rn = 1
+        timezone('Pacific/Auckland', bucket)::date AS nz_date,
+        %s::date - timezone('Pacific/Auckland', bucket)::date AS days_ago
+    FROM savings_daily
+    WHERE tenant = %s
 )
 
 SELECT *
 FROM daily_totals
 WHERE days_ago >= 0
         """,
-                (now_nz,),
+            (now_nz, tenant),
+            schema={
+                "platform": pl.String,
+                "account": pl.String,
+                "amount": pl.Float64,
+                "nz_date": pl.Date,
+                "days_ago": pl.Int32,
+            },
+        )
+
+        def past_data(data: pl.DataFrame, days_ago: int) -> pl.DataFrame:
+            return (
+                data.filter(pl.col.days_ago >= days_ago)
+                .group_by(["platform", "account"])
+                .agg(pl.col.days_ago.min())
+                .join(data, on=["platform", "account", "days_ago"])
+                .group_by("platform")
+                .agg(pl.col.amount.sum().round(2))
+                .sort(by="platform", descending=False)
+            )
+
+        today = past_data(data, 0)
+        yesterday = past_data(data, 1)
+        last_week = past_data(data, 7)
+        last_month = past_data(data, 30)
+        last_year = past_data(data, 365)
+
+        today_total = round(today["amount"].sum())
+        yesterday_total = round(yesterday["amount"].sum())
+
+        today_weights = today.with_columns((pl.col.amount / today_total).round(2))
+        yesterday_weights = yesterday.with_columns(
+            (pl.col.amount / yesterday_total).round(2)
+        )
+
+        return {
+            "holdings": {
+                "today": dict(today.rows()),
+                "yesterday": dict(yesterday.rows()),
+            },
+            "weightings": {
+                "today": dict(today_weights.rows()),
+                "yesterday": dict(yesterday_weights.rows()),
+            },
+            "total": today_total,
+            "yesterday_total": yesterday_total,
+            "pct_change": round(100 * today_total / yesterday_total - 100, 1)
+            if yesterday.shape[0] > 0
+            else None,
+            "week_over_week": round(
+                100 * today_total / last_week["amount"].sum() - 100, 1
+            )
+            if last_week.shape[0] > 0
+            else None,
+            "month_over_month": round(
+                100 * today_total / last_month["amount"].sum() - 100, 1
             )
-            result = cur.fetchall()
-            data = pl.from_dicts(result)
-
-            def past_data(data: pl.DataFrame, days_ago: int) -> pl.DataFrame:
-                return (
-                    data.filter(pl.col.days_ago >= days_ago)
-                    .group_by(["platform", "account"])
-                    .agg(pl.col.days_ago.min())
-                    .join(data, on=["platform", "account", "days_ago"])
-                    .group_by("platform")
-                    .agg(pl.col.amount.sum().round(2))
-                    .sort(by="platform", descending=False)
-                )
-
-            today = past_data(data, 0)
-            yesterday = past_data(data, 1)
-            last_week = past_data(data, 7)
-            last_month = past_data(data, 30)
-            last_year = past_data(data, 365)
-
-            today_total = round(today["amount"].sum())
-            yesterday_total = round(yesterday["amount"].sum())
-
-            today_weights = today.with_columns((pl.col.amount / today_total).round(2))
-            yesterday_weights = yesterday.with_columns(
-                (pl.col.amount / yesterday_total).round(2)
+            if last_month.shape[0] > 0
+            else None,
+            "year_over_year": round(
+                100 * today_total / last_year["amount"].sum() - 100, 1
             )
+            if last_year.shape[0] > 0
+            else None,
+        }
 
-            return {
-                "holdings": {
-                    "today": dict(today.rows()),
-                    "yesterday": dict(yesterday.rows()),
-                },
-                "weightings": {
-                    "today": dict(today_weights.rows()),
-                    "yesterday": dict(yesterday_weights.rows()),
-                },
-                "total": today_total,
-                "yesterday_total": yesterday_total,
-                "pct_change": round(100 * today_total / yesterday_total - 100, 1)
-                if yesterday.shape[0] > 0
-                else None,
-                "week_over_week": round(
-                    100 * today_total / last_week["amount"].sum() - 100, 1
-                )
-                if last_week.shape[0] > 0
-                else None,
-                "month_over_month": round(
-                    100 * today_total / last_month["amount"].sum() - 100, 1
-                )
-                if last_month.shape[0] > 0
-                else None,
-                "year_over_year": round(
-                    100 * today_total / last_year["amount"].sum() - 100, 1
-                )
-                if last_year.shape[0] > 0
-                else None,
-            }
+    def get_amounts(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        tenant: str = DEFAULT_TENANT,
+        resolution: Resolution = "day",
+        platforms: list[str] | None = None,
+        accounts: list[str] | None = None,
+    ) -> pl.DataFrame:
+        """Dense, forward-filled amounts in long form.
 
-    def get_history(
-        self, history_days: int
-    ) -> list[dict[str, datetime.date | float | None]]:
-        now_nz = datetime.datetime.now(tz=pytz.timezone("Pacific/Auckland"))
+        One row per bucket between NZ dates ``start`` and ``end`` and per
+        platform/account, with columns ``nz_date`` (``nz_time`` for hourly),
+        ``platform``, ``account`` and ``amount``. Buckets are read from the rollup
+        for ``resolution`` rather than raw snapshots, and gap filling happens in the
+        database, so only the finished grid is sent back. ``platforms`` and
+        ``accounts`` limit it to those series.
+        """
+        view, width = ROLLUPS[resolution]
+        index = "nz_date" if resolution == "day" else "nz_time"
+        tz = pytz.timezone("Pacific/Auckland")
+        lower = tz.localize(datetime.datetime.combine(start, datetime.time()))
+        upper = tz.localize(
+            datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time())
+        )
+
+        # Buckets in the window, plus each account's last value before it (moved
+        # to the window start) so it can be carried in. Each bucket takes the
+        # account's latest observation, and empty ones carry the previous value.
+        query = sql.SQL(
+            """
+        WITH candidates AS (
+            SELECT time, platform, account, amount
+            FROM {view}
+            WHERE tenant = %(tenant)s AND bucket >= %(lower)s AND bucket < %(upper)s
+                {filters}
+            UNION ALL
+            SELECT %(lower)s AS time, platform, account, amount
+            FROM (
+                SELECT DISTINCT ON (platform, account) platform, account, amount
+                FROM {view}
+                WHERE tenant = %(tenant)s AND bucket < %(lower)s {filters}
+                ORDER BY platform, account, bucket DESC
+            ) carried
+            WHERE amount != 0
+        )
+
+        SELECT
+            timezone('Pacific/Auckland', bucket){cast} AS {index},
+            platform,
+            account,
+            amount
+        FROM (
+            SELECT
+                time_bucket_gapfill(
+                    INTERVAL {width}, time, 'Pacific/Auckland', %(lower)s, %(upper)s
+                ) AS bucket,
+                platform,
+                account,
+                locf(last(amount, time)) AS amount
+            FROM candidates
+            GROUP BY bucket, platform, account
+        ) filled
+        ORDER BY {index}, platform, account
+                """
+        ).format(
+            view=sql.Identifier(view),
+            width=sql.Literal(width),
+            cast=sql.SQL("::date" if resolution == "day" else ""),
+            index=sql.Identifier(index),
+            filters=series_filter(platforms, accounts),
+        )
+        return self.read_frame(
+            query,
+            {
+                "lower": lower,
+                "upper": upper,
+                "tenant": tenant,
+                "platforms": platforms,
+                "accounts": accounts,
+            },
+            schema={
+                index: pl.Date if resolution == "day" else pl.Datetime,
+                "platform": pl.String,
+                "account": pl.String,
+                "amount": pl.Float64,
+            },
+        )
 
+    def first_date(self, tenant: str = DEFAULT_TENANT) -> datetime.date | None:
+        """NZ date of the tenant's earliest stored balance."""
         with (
             self.get_connection() as conn,
             conn.cursor(cursor_factory=RealDictCursor) as cur,
         ):
-            # Get latest for each account/platform for today and yesterday (NZ time)
             cur.execute(
                 """
-        WITH latest_per_day AS (
-            SELECT
-                *,
-                ROW_NUMBER() OVER (
-                    PARTITION BY account, platform, timezone('Pacific/Auckland', time)::date
-                    ORDER BY time DESC
-                ) AS rn,
-                timezone('Pacific/Auckland', time)::date AS nz_date
-            FROM savings
-        ),
-        daily_totals AS (
-            SELECT
-                platform,
-                account,
-                amount,
-                %s::date - nz_date AS days_ago
-            FROM latest_per_day
-            WHERE rn = 1
-        )
-
-        SELECT *
-        FROM daily_totals
-        WHERE days_ago >= 0 and days_ago <= %s
+SELECT MIN(timezone('Pacific/Auckland', bucket))::date AS nz_date
+FROM savings_daily
+WHERE tenant = %(tenant)s
                 """,
-                (now_nz, history_days),
+                {"tenant": tenant},
             )
-            result = cur.fetchall()
-            data = pl.from_dicts(result)
-
-        all_platforms = data[["platform", "account"]].unique()
-        index = pl.DataFrame(
-            [
-                {"days_ago": i, "nz_date": now_nz.date() - datetime.timedelta(days=i)}
-                for i in range(history_days + 1)
-            ]
+            return cur.fetchone()["nz_date"]
+
+    def get_daily_amounts(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        tenant: str = DEFAULT_TENANT,
+        platforms: list[str] | None = None,
+        accounts: list[str] | None = None,
+    ) -> pl.DataFrame:
+        """Dense daily amounts, see ``get_amounts``."""
+        return self.get_amounts(start, end, tenant, "day", platforms, accounts)
+
+    def get_history(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        since: datetime.date | None = None,
+        tenant: str = DEFAULT_TENANT,
+        resolution: Resolution = "day",
+        platforms: list[str] | None = None,
+        accounts: list[str] | None = None,
+    ) -> list[dict[str, datetime.date | datetime.datetime | float | None]]:
+        data = self.get_amounts(start, end, tenant, resolution, platforms, accounts)
+        index = data.columns[0]
+        data = data.select(
+            index,
+            investment=pl.concat_str(["platform", "account"], separator=" - "),
+            amount="amount",
         )
-        history_index = all_platforms.join(index, how="cross")
+        if since is not None:
+            data = data.filter(pl.col(index) >= since)
+
+        with stage("pivot"):
+            history = data.pivot(on="investment", index=index, values="amount")
+            return history.to_dicts()
+
+    def get_account_history(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        platform: str,
+        account: str,
+        since: datetime.date | None = None,
+        tenant: str = DEFAULT_TENANT,
+        resolution: Resolution = "day",
+    ) -> list[dict[str, datetime.date | datetime.datetime | float | None]]:
+        """One account's amounts as ``nz_date`` (or ``nz_time``) and ``amount`` rows."""
+        data = self.get_amounts(start, end, tenant, resolution, [platform], [account])
+        index = data.columns[0]
+        if since is not None:
+            data = data.filter(pl.col(index) >= since)
+        return data.select(index, "amount").to_dicts()
+
+    def get_daily_flows(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        tenant: str = DEFAULT_TENANT,
+        platforms: list[str] | None = None,
+        accounts: list[str] | None = None,
+    ) -> pl.DataFrame:
+        """Net deposits/withdrawals per NZ date and platform/account.
+
+        Interest, fees and tax are excluded since they are part of an account's
+        return rather than money moved in or out of it.
+        """
+        return self.read_frame(
+            sql.SQL(
+                """
+SELECT
+    platform,
+    account,
+    timezone('Pacific/Auckland', time)::date AS nz_date,
+    SUM(amount) AS flow
+FROM transactions
+WHERE tenant = %(tenant)s
+    AND time >= timezone('Pacific/Auckland', %(start)s::date::timestamp)
+    AND time < timezone('Pacific/Auckland', (%(end)s::date + 1)::timestamp)
+    AND type NOT IN %(non_flow_types)s
+    {filters}
+GROUP BY platform, account, nz_date
+                """
+            ).format(filters=series_filter(platforms, accounts)),
+            {
+                "start": start,
+                "end": end,
+                "non_flow_types": NON_FLOW_TYPES,
+                "tenant": tenant,
+                "platforms": platforms,
+                "accounts": accounts,
+            },
+            schema={
+                "platform": pl.String,
+                "account": pl.String,
+                "nz_date": pl.Date,
+                "flow": pl.Float64,
+            },
+        )
+
+    def get_history_percentage(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        since: datetime.date | None = None,
+        tenant: str = DEFAULT_TENANT,
+        platforms: list[str] | None = None,
+        accounts: list[str] | None = None,
+    ) -> list[dict[str, datetime.date | float | None]]:
+        daily = self.get_daily_amounts(start, end, tenant, platforms, accounts)
+        if daily.is_empty():
+            return []
 
-        data = (
-            data.join(
-                history_index, on=["platform", "account", "days_ago"], how="right"
+        # Each day's growth excludes that day's deposits/withdrawals, so moving
+        # money in or out doesn't show up as a return
+        returns = (
+            daily.join(
+                self.get_daily_flows(start, end, tenant, platforms, accounts),
+                on=["nz_date", "platform", "account"],
+                how="left",
             )
-            .sort("days_ago", "platform", "account", descending=True, nulls_last=True)
             .with_columns(
-                amount=pl.col.amount.forward_fill().over(["platform", "account"]),
+                growth=(pl.col.amount - pl.col.flow.fill_null(0))
+                / pl.col.amount.shift().over(["platform", "account"]),
                 investment=pl.concat_str(["platform", "account"], separator=" - "),
             )
-            .select("nz_date", "investment", "amount")
+            .with_columns(
+                growth=pl.col.growth.cum_prod()
+                .over(["platform", "account"])
+                .fill_nan(0)
+            )
+            .select("nz_date", "investment", "growth")
         )
+        if since is not None:
+            returns = returns.filter(pl.col.nz_date >= since)
+        with stage("pivot"):
+            return returns.pivot(
+                on="investment", index="nz_date", values="growth"
+            ).to_dicts()
 
-        history = data.pivot(on="investment", index="nz_date", values="amount")
-        return history.to_dicts()
+    def history_version(self, tenant: str = DEFAULT_TENANT) -> datetime.datetime | None:
+        """Latest insert time, so clients can tell whether anything has changed.
 
-    def get_history_percentage(
-        self, history_days: int
-    ) -> list[dict[str, datetime.date | float | None]]:
-        history = pl.DataFrame(self.get_history(history_days))
-        lagged = history.clone()
-        lagged = lagged.with_columns(
-            lagged_date=pl.col.nz_date + datetime.timedelta(days=1)
-        )
-        joined_lag = history.join(
-            lagged, left_on="nz_date", right_on="lagged_date", how="left"
-        )
+        Rows saved before ``inserted_at`` existed fall back to their sample time.
+        """
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            cur.execute(
+                """
+SELECT GREATEST(
+    (
+        SELECT COALESCE(MAX(inserted_at), MAX(time))
+        FROM savings
+        WHERE tenant = %(tenant)s
+    ),
+    (SELECT MAX(inserted_at) FROM transactions WHERE tenant = %(tenant)s)
+) AS version
+                """,
+                {"tenant": tenant},
+            )
+            return cur.fetchone()["version"]
 
-        investments = [
-            col
-            for col in joined_lag.columns
-            if ("nz_date" not in col) and ("_right" not in col)
-        ]
+    def first_changed_date(
+        self, version: datetime.datetime, tenant: str = DEFAULT_TENANT
+    ) -> datetime.date | None:
+        """Earliest NZ date with a balance or transaction inserted after ``version``.
 
-        for inv in investments:
-            joined_lag = joined_lag.with_columns(
-                (pl.col(inv) / pl.col(inv + "_right")).cum_prod().fill_nan(0).alias(inv)
+        Backfilled rows (e.g. from ``identify_expired`` or late-settling
+        transactions) are dated in the past, so this can be well before today.
+        """
+        with (
+            self.get_connection() as conn,
+            conn.cursor(cursor_factory=RealDictCursor) as cur,
+        ):
+            cur.execute(
+                """
+SELECT MIN(timezone('Pacific/Auckland', time)::date) AS nz_date
+FROM (
+    SELECT time
+    FROM savings
+    WHERE tenant = %(tenant)s AND inserted_at > %(version)s
+    UNION ALL
+    SELECT time
+    FROM transactions
+    WHERE tenant = %(tenant)s AND inserted_at > %(version)s
+) changed
+                """,
+                {"version": version, "tenant": tenant},
             )
-        return joined_lag.select(~pl.selectors.contains("_right")).to_dicts()
+            return cur.fetchone()["nz_date"]
 
     def identify_expired(self, expiry_days: int = 5) -> None:
         with (
@@ -245,38 +885,48 @@ WHERE days_ago >= 0
         ):
             cur.execute(
                 """
-INSERT INTO savings (time, platform, account, amount)
+INSERT INTO savings (time, platform, account, amount, tenant)
+-- Read from the rollup, since raw rows of an unchanged account get dropped
 WITH most_recent AS (
-    SELECT
+    SELECT DISTINCT ON (tenant, platform, account)
+        tenant,
         platform,
         account,
-        MAX(time) AS datetime
-    FROM savings
-    GROUP BY platform, account
+        time AS datetime,
+        amount
+    FROM savings_daily
+    ORDER BY tenant, platform, account, bucket DESC
 ),
 most_recent_with_amount AS (
     SELECT
+        mr.tenant,
         mr.platform,
         mr.account,
-        mr.datetime,
-        s.amount
+        GREATEST(mr.datetime, h.last_seen) AS datetime,
+        mr.amount
     FROM most_recent mr
-    JOIN savings s
-        ON mr.platform = s.platform
-        AND mr.account = s.account
-        AND mr.datetime = s.time
+    LEFT JOIN account_heartbeats h
+        ON mr.tenant = h.tenant
+        AND mr.platform = h.platform
+        AND mr.account = h.account
 )
 SELECT
 	datetime + INTERVAL '1 day' AS time,
     platform,
     account,
-    0 AS amount
+    0 AS amount,
+    tenant
 FROM most_recent_with_amount
 WHERE (CURRENT_DATE - datetime) > INTERVAL '%s days'
     AND amount != 0
+RETURNING time
                         """,
                 (expiry_days,),
             )
+            backfilled = [row["time"] for row in cur.fetchall()]
+            conn.commit()
+        if backfilled:
+            self.refresh_rollups(min(backfilled))
 
 
 if __name__ == "__main__":
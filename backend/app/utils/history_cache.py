@@ -0,0 +1,223 @@
+import datetime
+import os
+import threading
+import urllib.parse
+import uuid
+from typing import NamedTuple
+
+import polars as pl
+
+from ..config import settings
+from .dates import nz_today
+from .db import DEFAULT_TENANT, Resolution, SavingsDB
+from .logger import MyLogger
+from .profiling import stage
+
+logger = MyLogger().get_logger()
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.UTC)
+
+# Days re-read on every refresh. Matches the rollups' refresh window, so a
+# backfill that reaches them after it was first seen still makes it in.
+REFRESH_DAYS = 30
+
+
+class Snapshot(NamedTuple):
+    path: str
+    start: datetime.date
+    end: datetime.date
+    version: int  # History version, in microseconds since the epoch
+
+
+def file_prefix(tenant: str) -> str:
+    """Tenant name made safe for file names, with no dots to split on."""
+    return urllib.parse.quote(tenant, safe="").replace(".", "%2E")
+
+
+def fill_grid(
+    data: pl.DataFrame, start: datetime.date, end: datetime.date
+) -> pl.DataFrame:
+    """Every day from ``start`` to ``end`` for each platform/account in ``data``.
+
+    Missing days carry the account's previous amount, or null before its first.
+    """
+    days = pl.date_range(start, end, eager=True).alias("nz_date").to_frame()
+    return (
+        days.join(data.select("platform", "account").unique(), how="cross")
+        .join(data, on=["nz_date", "platform", "account"], how="left")
+        .sort("platform", "account", "nz_date")
+        .with_columns(pl.col.amount.forward_fill().over("platform", "account"))
+        .sort("nz_date", "platform", "account")
+    )
+
+
+class HistoryCache(SavingsDB):
+    """``SavingsDB`` that serves settled daily history from local Arrow IPC files.
+
+    Days before today only change through backfills, so each tenant's dense daily
+    grid up to yesterday is kept in an uncompressed IPC file, named after the days
+    it covers and the history version it was built at. Reads memory-map the file,
+    so workers share its pages, and only ask Postgres for days after it. When the
+    version moves, days from the earliest changed one are rebuilt and the rest
+    kept.
+    """
+
+    def __init__(self, directory: str, **kwargs: str) -> None:
+        super().__init__(**kwargs)
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._tenant_locks: dict[str, threading.Lock] = {}
+
+    def _tenant_lock(self, tenant: str) -> threading.Lock:
+        """Lock serialising one tenant's rebuilds, leaving other tenants' reads free."""
+        with self._lock:
+            return self._tenant_locks.setdefault(tenant, threading.Lock())
+
+    def _snapshots(self, tenant: str) -> list[Snapshot]:
+        """The tenant's files, oldest version first."""
+        prefix = file_prefix(tenant)
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        snapshots = []
+        for name in names:
+            parts = name.split(".")
+            if len(parts) == 5 and parts[0] == prefix and parts[4] == "arrow":
+                snapshots.append(
+                    Snapshot(
+                        os.path.join(self.directory, name),
+                        datetime.date.fromisoformat(parts[1]),
+                        datetime.date.fromisoformat(parts[2]),
+                        int(parts[3]),
+                    )
+                )
+        return sorted(snapshots, key=lambda snapshot: snapshot.version)
+
+    def refresh(self, tenant: str = DEFAULT_TENANT) -> Snapshot | None:
+        """Bring the tenant's file up to yesterday and the current history version.
+
+        :return: The up to date file, or None when there's no settled history yet
+        """
+        version = self.history_version(tenant)
+        settled = nz_today() - datetime.timedelta(days=1)
+        with self._tenant_lock(tenant):
+            snapshots = self._snapshots(tenant)
+            current = snapshots[-1] if snapshots else None
+            if version is None:
+                return None
+            stamp = (version - EPOCH) // datetime.timedelta(microseconds=1)
+            if current and current.version >= stamp and current.end >= settled:
+                return current
+
+            grid = None
+            if current is not None:
+                changed = self.first_changed_date(
+                    EPOCH + datetime.timedelta(microseconds=current.version), tenant
+                )
+                rebuild = min(
+                    changed or datetime.date.max,
+                    current.end + datetime.timedelta(days=1),
+                    settled - datetime.timedelta(days=REFRESH_DAYS - 1),
+                )
+                if rebuild > current.start:
+                    start = current.start
+                    grid = pl.read_ipc(current.path, memory_map=False).filter(
+                        pl.col.nz_date < rebuild
+                    )
+                    if rebuild <= settled:
+                        grid = pl.concat(
+                            [grid, super().get_amounts(rebuild, settled, tenant)]
+                        )
+            if grid is None:
+                start = self.first_date(tenant)
+                if start is None or start > settled:
+                    return None
+                grid = super().get_amounts(start, settled, tenant)
+
+            snapshot = Snapshot(
+                os.path.join(
+                    self.directory,
+                    f"{file_prefix(tenant)}.{start}.{settled}.{stamp}.arrow",
+                ),
+                start,
+                settled,
+                stamp,
+            )
+            os.makedirs(self.directory, exist_ok=True)
+            # Written aside and renamed into place, so readers never see half a file
+            partial = f"{snapshot.path}.{uuid.uuid4().hex}.tmp"
+            fill_grid(grid, start, settled).write_ipc(partial)
+            os.replace(partial, snapshot.path)
+            for old in snapshots:
+                if old.path != snapshot.path:
+                    try:
+                        os.remove(old.path)
+                    except FileNotFoundError:
+                        pass
+            logger.info(f"Refreshed history file for {tenant} up to {settled}")
+            return snapshot
+
+    def get_amounts(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        tenant: str = DEFAULT_TENANT,
+        resolution: Resolution = "day",
+        platforms: list[str] | None = None,
+        accounts: list[str] | None = None,
+    ) -> pl.DataFrame:
+        """``SavingsDB.get_amounts``, with settled days read from the tenant's file.
+
+        Hourly history isn't cached and comes straight from the database.
+        """
+        snapshot = self.refresh(tenant) if resolution == "day" else None
+        if snapshot is None or start > snapshot.end or end < snapshot.start:
+            return super().get_amounts(
+                start, end, tenant, resolution, platforms, accounts
+            )
+        # The day before the window shows which accounts carry a value in
+        selected = pl.col.nz_date.is_between(start - datetime.timedelta(days=1), end)
+        if platforms:
+            selected &= pl.col.platform.is_in(platforms)
+        if accounts:
+            selected &= pl.col.account.is_in(accounts)
+        try:
+            with stage("history file"):
+                cached = (
+                    pl.scan_ipc(snapshot.path, memory_map=True)
+                    .filter(selected)
+                    .collect()
+                )
+        except FileNotFoundError:
+            # Replaced by another worker since it was found
+            return super().get_amounts(
+                start, end, tenant, resolution, platforms, accounts
+            )
+        live = (
+            super().get_amounts(
+                snapshot.end + datetime.timedelta(days=1),
+                end,
+                tenant,
+                resolution,
+                platforms,
+                accounts,
+            )
+            if end > snapshot.end
+            else cached.clear()
+        )
+
+        # Same accounts as the database would return: any with a value in the
+        # window or carried into it, leaving out ones emptied before it started
+        active = pl.concat(
+            [cached.filter(pl.col.amount != 0), live], how="vertical"
+        ).select("platform", "account")
+        window = pl.concat(
+            [cached.filter(pl.col.nz_date >= start), live], how="vertical"
+        ).join(active.unique(), on=["platform", "account"], how="semi")
+        with stage("fill_grid"):
+            return fill_grid(window, start, end)
+
+
+# Shared by everything in the process, so each tenant's lock covers all its rebuilds
+history_cache = HistoryCache(settings.history_cache_dir)
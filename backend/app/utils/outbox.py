@@ -0,0 +1,192 @@
+import os
+import sqlite3
+import time
+import uuid
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta
+
+from ..config import settings
+from .broadcast import publish_snapshot
+from .db import SavingsDB, SavingsRow
+from .history_cache import history_cache
+from .logger import MyLogger
+
+
+class Outbox:
+    """Durable local queue between fetching snapshots and writing them to Postgres.
+
+    Fetched rows are committed to a SQLite file first, so they survive Postgres
+    being unreachable or the process restarting, then flushed to ``savings`` in
+    batches. Workers share the file and claim a batch before writing it. A claim
+    older than ``lease`` seconds is taken over, so a flush that died part way is
+    retried, and ``SavingsDB.insert_many`` skips rows that already made it.
+
+    Scheduled jobs' leases are kept in the same file, so fetches are still shared
+    out between workers while Postgres is down.
+    """
+
+    def __init__(
+        self, db: SavingsDB, path: str, batch_size: int = 500, lease: float = 300
+    ) -> None:
+        self.db = db
+        self.path = path
+        self.batch_size = batch_size
+        self.lease = lease
+        self._ready = False
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with closing(sqlite3.connect(self.path)) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                        CREATE TABLE IF NOT EXISTS outbox (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            payload TEXT NOT NULL,
+                            claim TEXT,
+                            claimed_at REAL
+                        )
+                    """
+                )
+                conn.execute(
+                    """
+                        CREATE TABLE IF NOT EXISTS job_runs (
+                            job TEXT NOT NULL,
+                            slot TEXT NOT NULL,
+                            owner TEXT NOT NULL,
+                            PRIMARY KEY (job, slot)
+                        )
+                    """
+                )
+            self._ready = True
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def put(self, rows: list[SavingsRow]) -> None:
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO outbox (payload) VALUES (?)",
+                [(row.model_dump_json(),) for row in rows],
+            )
+
+    def claim_job(self, job: str, slot: datetime, owner: str) -> bool:
+        """Claim a scheduled job's run for ``slot``, returning whether we got it."""
+        with self._transaction() as conn:
+            claimed = conn.execute(
+                "INSERT OR IGNORE INTO job_runs (job, slot, owner) VALUES (?, ?, ?)",
+                (job, slot.isoformat(), owner),
+            ).rowcount
+            conn.execute(
+                "DELETE FROM job_runs WHERE slot < ?",
+                ((slot - timedelta(days=30)).isoformat(),),
+            )
+            return claimed == 1
+
+    def pending(self) -> int:
+        with self._transaction() as conn:
+            return conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def _claim(self) -> tuple[str, list[SavingsRow]]:
+        claim = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                    UPDATE outbox SET claim = ?, claimed_at = ?
+                    WHERE id IN (
+                        SELECT id FROM outbox
+                        WHERE claim IS NULL OR claimed_at < ?
+                        ORDER BY id
+                        LIMIT ?
+                    )
+                """,
+                (claim, now, now - self.lease, self.batch_size),
+            )
+            payloads = conn.execute(
+                "SELECT payload FROM outbox WHERE claim = ? ORDER BY id", (claim,)
+            ).fetchall()
+        return claim, [
+            SavingsRow.model_validate_json(payload) for (payload,) in payloads
+        ]
+
+    def _finish(self, claim: str, flushed: bool) -> None:
+        with self._transaction() as conn:
+            if flushed:
+                conn.execute("DELETE FROM outbox WHERE claim = ?", (claim,))
+            else:
+                conn.execute(
+                    "UPDATE outbox SET claim = NULL, claimed_at = NULL WHERE claim = ?",
+                    (claim,),
+                )
+
+    def flush(self) -> list[SavingsRow]:
+        """Write queued rows to Postgres until none are left or a write fails.
+
+        :return: Rows written
+        """
+        written = []
+        while True:
+            claim, rows = self._claim()
+            if not rows:
+                return written
+            try:
+                self.db.insert_many(rows)
+            except Exception:
+                self._finish(claim, flushed=False)
+                logger.exception(
+                    f"Failed to write {len(rows)} queued snapshots, will retry"
+                )
+                return written
+            self._finish(claim, flushed=True)
+            written.extend(rows)
+
+
+logger = MyLogger().get_logger()
+db_con = history_cache
+outbox = Outbox(db_con, settings.outbox_path)
+# Flushes run here rather than in the fetch job, so database latency never slows
+# a fetch down
+flusher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox-flush")
+
+
+def flush_outbox() -> int:
+    """Write any queued snapshots, then publish them and refresh cached history."""
+    rows = outbox.flush()
+    for tenant in {row.tenant for row in rows}:
+        publish_snapshot([row for row in rows if row.tenant == tenant])
+        try:
+            db_con.refresh(tenant)
+        except Exception:
+            logger.exception(f"Failed to refresh cached history for {tenant}")
+    return len(rows)
+
+
+def flush_queued() -> None:
+    try:
+        flush_outbox()
+    except Exception:
+        logger.exception("Failed to flush queued snapshots")
+
+
+def save_rows(rows: list[SavingsRow]) -> None:
+    """Queue fetched snapshots durably, and start writing them in the background.
+
+    Rows that can't be written yet stay queued for the scheduled flush.
+    """
+    if rows:
+        outbox.put(rows)
+        flusher.submit(flush_queued)
@@ -0,0 +1,373 @@
+import contextvars
+import functools
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import Counter, deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import UTC, datetime
+
+import polars as pl
+import psycopg2.extensions
+from psycopg2 import sql
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..config import settings
+from .logger import MyLogger
+
+logger = MyLogger().get_logger()
+
+# Served by the utility router, and never profiled themselves
+PROFILES_PATH = "/utility/profiles"
+
+# Query parameters carrying credentials, left out of saved profiles
+SECRET_PARAMS = ("profile", "api_key")
+
+# Long-lived event streams, which would hold a profile open for their lifetime
+STREAM_PATHS = ("/portfolio/stream",)
+
+# Innermost frames of threads parked waiting for work, left out of the stacks
+IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+
+class Profile:
+    """Timings gathered for one profiled request.
+
+    ``stacks`` counts wall-clock samples of every busy thread's stack, so work from
+    requests running at the same time can show up too. ``sql`` and ``polars`` only
+    hold work done for this request.
+    """
+
+    def __init__(self, method: str, path: str, query: str, reason: str) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.query = query
+        self.reason = reason
+        self.started = datetime.now(tz=UTC)
+        self.status: int | None = None
+        self.ms = 0.0
+        self.sql: list[dict[str, str | float]] = []
+        self.polars: list[dict[str, str | float | None]] = []
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+
+    def summary(self) -> dict[str, str | int | float | None]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "reason": self.reason,
+            "started": self.started.isoformat(),
+            "status": self.status,
+            "ms": round(self.ms, 2),
+            "sql_ms": round(sum(query["ms"] for query in self.sql), 2),
+            "polars_ms": round(
+                sum(stage["ms"] for stage in self.polars if stage["node"] is None), 2
+            ),
+            "samples": self.samples,
+        }
+
+    def save(self, directory: str, keep: int) -> None:
+        """Write the profile out and drop all but the newest ``keep``."""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{self.id}.folded"), "w") as file:
+            file.writelines(
+                f"{stack} {count}\n" for stack, count in self.stacks.items()
+            )
+        with open(os.path.join(directory, f"{self.id}.json"), "w") as file:
+            json.dump(self.summary() | {"sql": self.sql, "polars": self.polars}, file)
+        for stale in list_profiles(directory)[keep:]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(directory, stale + suffix))
+                except FileNotFoundError:
+                    pass
+
+
+_current: contextvars.ContextVar[Profile | None] = contextvars.ContextVar(
+    "profile", default=None
+)
+
+
+def current() -> Profile | None:
+    """Profile of the request being handled, if it's being profiled."""
+    return _current.get()
+
+
+def list_profiles(directory: str) -> list[str]:
+    """Saved profile ids, newest first."""
+    try:
+        names = [name for name in os.listdir(directory) if name.endswith(".json")]
+    except FileNotFoundError:
+        return []
+    paths = [os.path.join(directory, name) for name in names]
+    return [
+        os.path.basename(path).removesuffix(".json")
+        for path in sorted(paths, key=os.path.getmtime, reverse=True)
+    ]
+
+
+class Sampler(threading.Thread):
+    """Counts the stacks of busy threads every ``interval`` seconds, for at most
+    ``limit`` seconds.
+
+    Stacks are kept in the folded format flame graph tools (``flamegraph.pl``,
+    speedscope, inferno) read, one frame per function.
+    """
+
+    def __init__(self, profile: Profile, interval: float, limit: float) -> None:
+        super().__init__(name="profile-sampler", daemon=True)
+        self.profile = profile
+        self.interval = interval
+        self.limit = limit
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        deadline = time.monotonic() + self.limit
+        while not self._done.wait(self.interval) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_qualname} "
+                        f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                self.profile.stacks[
+                    ";".join([names.get(ident, str(ident)), *reversed(stack)])
+                ] += 1
+            self.profile.samples += 1
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join()
+
+
+class Limiter:
+    """Lets at most ``per_minute`` profiles start each minute, one at a time."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.per_minute = per_minute
+        self._lock = threading.Lock()
+        self._busy = False
+        self._started: deque[float] = deque()
+
+    def acquire(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            while self._started and self._started[0] < now - 60:
+                self._started.popleft()
+            if self._busy or len(self._started) >= self.per_minute:
+                return False
+            self._busy = True
+            self._started.append(now)
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._busy = False
+
+
+limiter = Limiter(settings.profile_rate_limit)
+
+
+def authorised(token: str | None) -> bool:
+    return bool(settings.profile_token) and secrets.compare_digest(
+        token or "", settings.profile_token
+    )
+
+
+class ProfilingMiddleware:
+    """Profiles requests that ask for it, plus a random sample of the rest.
+
+    A request carrying ``profile_token`` in an ``X-Profile`` header or ``profile``
+    query parameter is profiled, as is a ``profile_sample_rate`` fraction of other
+    requests, both within this worker's ``profile_rate_limit``. Profiled responses
+    carry an ``X-Profile-Id`` to fetch the result from ``/utility/profiles``.
+    Event streams aren't profiled. Nothing happens unless ``profile_token`` is set.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or not settings.profile_token
+            or scope["path"].startswith(PROFILES_PATH)
+            or scope["path"] in STREAM_PATHS
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        if "text/event-stream" in request.headers.get("Accept", ""):
+            await self.app(scope, receive, send)
+            return
+        if authorised(
+            request.headers.get("X-Profile") or request.query_params.get("profile")
+        ):
+            reason = "requested"
+        elif random.random() < settings.profile_sample_rate:
+            reason = "sampled"
+        else:
+            await self.app(scope, receive, send)
+            return
+        if not limiter.acquire():
+            await self.app(scope, receive, send)
+            return
+
+        query = urllib.parse.urlencode(
+            [
+                (name, value)
+                for name, value in urllib.parse.parse_qsl(
+                    request.url.query, keep_blank_values=True
+                )
+                if name not in SECRET_PARAMS
+            ]
+        )
+        profile = Profile(request.method, request.url.path, query, reason)
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                MutableHeaders(scope=message).append("X-Profile-Id", profile.id)
+            await send(message)
+
+        token = _current.set(profile)
+        sampler = Sampler(
+            profile, settings.profile_interval, settings.profile_max_seconds
+        )
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            profile.ms = (time.perf_counter() - start) * 1000
+            _current.reset(token)
+            limiter.release()
+            logger.info(f"Profiled {profile.method} {profile.path} as {profile.id}")
+            await run_in_threadpool(
+                profile.save, settings.profile_dir, settings.profile_keep
+            )
+
+
+def record_sql(
+    query: str | bytes | sql.Composable,
+    seconds: float,
+    context: psycopg2.extensions.cursor,
+) -> None:
+    """Add a statement to the active profile.
+
+    Never raises, so a statement can't fail just for being recorded. Statements
+    can come as bytes, like ``execute_values``' pages, or composed with ``sql``.
+    """
+    profile = current()
+    if profile is None:
+        return
+    try:
+        if isinstance(query, sql.Composable):
+            query = query.as_string(context)
+        if isinstance(query, bytes):
+            query = query.decode(errors="replace")
+        profile.sql.append(
+            {"query": " ".join(query.split())[:1000], "ms": round(seconds * 1000, 3)}
+        )
+    except Exception:
+        logger.exception("Failed to record a profiled statement")
+
+
+@functools.cache
+def timed_cursor(factory: type) -> type:
+    """``factory`` with its statements timed onto the active profile."""
+
+    class TimedCursor(factory):
+        def execute(
+            self, query: str | bytes | sql.Composable, vars: object = None
+        ) -> None:
+            start = time.perf_counter()
+            try:
+                return super().execute(query, vars)
+            finally:
+                record_sql(query, time.perf_counter() - start, self)
+
+        def copy_expert(self, query: str, file: object, size: int = 8192) -> None:
+            start = time.perf_counter()
+            try:
+                return super().copy_expert(query, file, size)
+            finally:
+                record_sql(query, time.perf_counter() - start, self)
+
+    return TimedCursor
+
+
+class TimedConnection(psycopg2.extensions.connection):
+    """Connection that times its cursors' statements, used while profiling."""
+
+    def cursor(self, *args: object, **kwargs: object) -> psycopg2.extensions.cursor:
+        factory = (
+            kwargs.pop("cursor_factory", None)
+            or self.cursor_factory
+            or psycopg2.extensions.cursor
+        )
+        return super().cursor(*args, cursor_factory=timed_cursor(factory), **kwargs)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block of DataFrame work onto the active profile."""
+    profile = current()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.polars.append(
+            {
+                "stage": name,
+                "node": None,
+                "ms": round((time.perf_counter() - start) * 1000, 3),
+            }
+        )
+
+
+def collect(frame: pl.LazyFrame, name: str) -> pl.DataFrame:
+    """``frame.collect()``, also recording each query node's time when profiling."""
+    profile = current()
+    if profile is None:
+        return frame.collect()
+    start = time.perf_counter()
+    result, nodes = frame.profile()
+    profile.polars.append(
+        {
+            "stage": name,
+            "node": None,
+            "ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+    )
+    profile.polars.extend(
+        {"stage": name, "node": node, "ms": (end - begin) / 1000}
+        for node, begin, end in nodes.iter_rows()
+    )
+    return result
@@ -0,0 +1,153 @@
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+import polars as pl
+
+from ..config import settings
+from .analytics import TOTAL
+from .profiling import collect
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Upper bound on simulated values per request (paths x horizon days x platforms
+# plus the total), to keep memory in check
+MAX_CELLS = 6_000_000
+
+
+@functools.cache
+def pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=settings.projection_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def daily_returns(daily: pl.DataFrame, flows: pl.DataFrame) -> pl.DataFrame:
+    """Flow-adjusted daily returns, one column per platform and one row per day.
+
+    Days a platform had no value (or was emptied without a matching transaction,
+    like a matured term deposit) count as a zero return.
+    """
+    returns = (
+        collect(
+            daily.lazy()
+            .join(flows.lazy(), on=["nz_date", "platform", "account"], how="left")
+            .group_by("nz_date", "platform")
+            .agg(pl.col.amount.sum(), pl.col.flow.sum())
+            .sort("platform", "nz_date")
+            .with_columns(previous=pl.col.amount.shift().over("platform"))
+            .with_columns(
+                daily_return=pl.when(
+                    (pl.col.previous > 0) & (pl.col.amount - pl.col.flow > 0)
+                ).then((pl.col.amount - pl.col.flow) / pl.col.previous - 1)
+            ),
+            "daily_returns",
+        )
+        .pivot(on="platform", index="nz_date", values="daily_return")
+        .sort("nz_date")
+        .slice(1)  # First day has nothing to compare against
+    )
+    return returns.select(sorted(returns.columns[1:])).fill_null(0)
+
+
+def simulate(
+    returns: np.ndarray,
+    start: np.ndarray,
+    contributions: np.ndarray,
+    horizon: int,
+    paths: int,
+    seed: np.random.SeedSequence,
+) -> np.ndarray:
+    """Simulated daily values with shape ``(paths, horizon, platforms)``.
+
+    Each simulated day resamples a whole historical day, so platforms keep their
+    correlation. Values follow ``v[t] = v[t-1] * (1 + r[t]) + c``, which unrolls to
+    ``v[t] = G[t] * (v[0] + c * sum(1 / G[:t + 1]))`` with ``G`` the cumulative
+    growth, so every path comes from a cumulative product and sum.
+    """
+    rng = np.random.default_rng(seed)
+    sampled = returns[rng.integers(len(returns), size=(paths, horizon))]
+    growth = np.cumprod(1 + sampled, axis=1)
+    return growth * (start + np.cumsum(contributions / growth, axis=1))
+
+
+def project(
+    daily: pl.DataFrame,
+    flows: pl.DataFrame,
+    horizon: int = 365,
+    paths: int = 2000,
+    contribution: float = 0.0,
+    seed: int | None = None,
+) -> dict[str, list | dict]:
+    """Monte Carlo percentile bands for each platform's and the total's value.
+
+    ``daily`` and ``flows`` are the frames from ``SavingsDB.get_daily_amounts`` and
+    ``SavingsDB.get_daily_flows`` to bootstrap returns from. ``contribution`` is a
+    monthly amount, paid in daily and split by current holdings. With
+    ``projection_workers`` set, batches of paths run across a process pool.
+    """
+    returns = daily_returns(daily, flows)
+    if returns.is_empty():
+        return {"summary": {}, "series": []}
+    platforms = returns.columns
+    last_date = daily["nz_date"].max()
+    holdings = dict(
+        daily.filter(pl.col.nz_date == last_date)
+        .group_by("platform")
+        .agg(pl.col.amount.sum())
+        .rows()
+    )
+    start = np.array([holdings.get(platform, 0.0) for platform in platforms])
+    weights = start / start.sum() if start.sum() > 0 else start
+    contributions = contribution * 12 / 365 * weights
+
+    batches = max(settings.projection_workers, 1)
+    sizes = [len(batch) for batch in np.array_split(np.arange(paths), batches)]
+    args = [
+        (returns.to_numpy(), start, contributions, horizon, size, child)
+        for size, child in zip(
+            sizes, np.random.SeedSequence(seed).spawn(batches), strict=True
+        )
+        if size > 0
+    ]
+    if settings.projection_workers > 1:
+        results = list(pool().map(simulate, *zip(*args, strict=True)))
+    else:
+        results = [simulate(*arg) for arg in args]
+
+    values = np.concatenate(results)
+    values = np.concatenate([values, values.sum(axis=2, keepdims=True)], axis=2)
+    bands = np.percentile(values, PERCENTILES, axis=0).round(2)
+    names = [*platforms, TOTAL]
+
+    # (percentile, day, platform) -> one row per platform and day
+    series = pl.DataFrame(
+        {
+            "nz_date": np.tile(
+                pl.date_range(
+                    last_date + timedelta(days=1),
+                    last_date + timedelta(days=horizon),
+                    eager=True,
+                ).to_numpy(),
+                len(names),
+            ),
+            "platform": np.repeat(names, horizon),
+        }
+        | {
+            f"p{percentile}": band.T.reshape(-1)
+            for percentile, band in zip(PERCENTILES, bands, strict=True)
+        }
+    )
+    return {
+        "summary": {
+            name: {
+                f"p{percentile}": float(band[-1, i])
+                for percentile, band in zip(PERCENTILES, bands, strict=True)
+            }
+            for i, name in enumerate(names)
+        },
+        "series": series.to_dicts(),
+    }
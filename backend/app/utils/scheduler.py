@@ -0,0 +1,52 @@
+import functools
+import os
+import socket
+from collections.abc import Callable
+from datetime import datetime
+
+import pytz
+
+from .logger import MyLogger
+from .outbox import outbox
+
+logger = MyLogger().get_logger()
+owner = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def leader_only(job: str, func: Callable) -> Callable:
+    """Wrap a scheduled job so only one worker process runs each firing.
+
+    Every worker schedules the same cron jobs, so each firing is claimed through a
+    lease row keyed on the job name and the minute it fired in. The first worker to
+    insert the row runs the job and the rest skip it. Leases are kept in the
+    workers' shared outbox file rather than Postgres, so snapshots are still
+    fetched and queued while the database is unreachable.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs) -> object:  # noqa: ANN002, ANN003
+        slot = datetime.now(tz=pytz.timezone("UTC")).replace(second=0, microsecond=0)
+        if not outbox.claim_job(job, slot, owner):
+            logger.info(f"Skipping {job} at {slot}, already claimed by another worker")
+            return None
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def save_schedule(provider: str) -> dict[str, str]:
+    """Cron fields for a provider's snapshots.
+
+    Read from ``<PROVIDER>_SAVE_TIME`` if set, e.g. hourly for market-linked
+    accounts, otherwise the shared ``SAVE_TIME``.
+    """
+    minute, hour, day, month, wday = (
+        os.environ.get(f"{provider}_SAVE_TIME") or os.environ["SAVE_TIME"]
+    ).split(" ")
+    return {
+        "minute": minute,
+        "hour": hour,
+        "day": day,
+        "month": month,
+        "day_of_week": wday,
+    }
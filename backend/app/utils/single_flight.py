@@ -0,0 +1,82 @@
+import functools
+import threading
+import time
+from collections.abc import Callable, Hashable
+
+from ..config import settings
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: object = None
+        self.error: Exception | None = None
+
+
+class SingleFlight:
+    """Coalesce identical concurrent calls and briefly cache their results.
+
+    The first caller for a key runs the function, any caller arriving while it is in
+    flight waits for and shares that result, and completed results are served from
+    memory for ``ttl`` seconds. Failures are shared with the waiters but not cached.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._results: dict[Hashable, tuple[float, object]] = {}
+        self._in_flight: dict[Hashable, _Call] = {}
+
+    def do(
+        self, key: Hashable, func: Callable, *args: object, **kwargs: object
+    ) -> object:
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and time.monotonic() - cached[0] < self.ttl:
+                return cached[1]
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+                if call.error is None:
+                    self._results[key] = (time.monotonic(), call.value)
+            call.done.set()
+        return call.value
+
+
+def single_flight(
+    _func: Callable | None = None, *, ttl: float | None = None
+) -> Callable:
+    """Decorate a function so identical concurrent calls share one execution.
+
+    Calls are keyed on their arguments, so bound methods are coalesced per instance.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        flight = SingleFlight(settings.live_cache_ttl if ttl is None else ttl)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> object:  # noqa: ANN002, ANN003
+            key = (args, tuple(sorted(kwargs.items())))
+            return flight.do(key, func, *args, **kwargs)
+
+        return wrapper
+
+    if _func is None:
+        return decorator
+    return decorator(_func)
@@ -0,0 +1,146 @@
+"""Local stand-in for the Akahu and InvestNow (adminis) APIs.
+
+Serves every provider from one process under a path prefix, so point the API at it
+with e.g.::
+
+    AKAHU_URL=http://localhost:9000/akahu/v1
+    INVESTNOW_LOGIN_URL=http://localhost:9000/investnow-login
+    INVESTNOW_API_URL=http://localhost:9000/investnow
+
+and run it with ``python -m loadtest.mock_providers --latency-ms 150``.
+
+Responses are synthesised by default. ``--record`` forwards each request to the
+real provider and saves the response under ``--fixtures``; later runs replay any
+saved fixture instead of synthesising one.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+from pathlib import Path
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+UPSTREAMS = {
+    "akahu": "https://api.akahu.io",
+    "investnow-login": "https://loginapi.adminis.co.nz",
+    "investnow": "https://webapi.adminis.co.nz",
+}
+# Headers worth forwarding when recording; everything else is hop-by-hop noise
+FORWARDED_HEADERS = ("authorization", "x-akahu-id", "accept", "content-type")
+
+
+class MockConfig:
+    def __init__(
+        self,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        failure_rate: float = 0,
+        fixtures: Path | None = None,
+        record: bool = False,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.fixtures = fixtures
+        self.record = record
+
+
+def synthesise(provider: str, path: str) -> dict:
+    """Plausible response for a provider path, stable per account ID."""
+    if provider == "akahu":
+        if re.fullmatch(r"v1/accounts/([^/]+)/transactions", path):
+            return {"success": True, "items": [], "cursor": {"next": None}}
+        if match := re.fullmatch(r"v1/accounts/([^/]+)", path):
+            seed = int(hashlib.sha256(match.group(1).encode()).hexdigest(), 16)
+            balance = round(1_000 + seed % 50_000 + random.uniform(-50, 50), 2)
+            return {
+                "success": True,
+                "item": {
+                    "_id": match.group(1),
+                    "balance": {"current": balance, "available": balance},
+                },
+            }
+    if provider == "investnow-login" and path == "connect/token":
+        return {"access_token": "mock-token"}
+    if provider == "investnow" and path.endswith("trialBalance"):
+        return {"netAssetValue": {"value": round(random.uniform(9_000, 11_000), 2)}}
+    return {"success": False, "message": f"No mock for {provider}/{path}"}
+
+
+def fixture_path(fixtures: Path, provider: str, path: str, query: str) -> Path:
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{path}?{query}" if query else path)
+    return fixtures / provider / f"{name}.json"
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI()
+
+    @app.api_route("/{provider}/{path:path}", methods=["GET", "POST"])
+    async def provider(provider: str, path: str, request: Request) -> JSONResponse:
+        delay = config.latency_ms + random.uniform(0, config.jitter_ms)
+        await asyncio.sleep(delay / 1000)
+        if random.random() < config.failure_rate:
+            return JSONResponse({"success": False, "message": "Injected"}, 503)
+
+        fixture = None
+        if config.fixtures is not None:
+            fixture = fixture_path(config.fixtures, provider, path, request.url.query)
+            if not config.record and fixture.exists():
+                return JSONResponse(json.loads(fixture.read_text()))
+
+        if config.record and provider in UPSTREAMS:
+            async with httpx.AsyncClient(timeout=10) as client:
+                upstream = await client.request(
+                    request.method,
+                    f"{UPSTREAMS[provider]}/{path}",
+                    params=request.query_params,
+                    content=await request.body(),
+                    headers={
+                        key: value
+                        for key, value in request.headers.items()
+                        if key in FORWARDED_HEADERS
+                    },
+                )
+            body = upstream.json()
+            if fixture is not None and upstream.is_success:
+                fixture.parent.mkdir(parents=True, exist_ok=True)
+                fixture.write_text(json.dumps(body, indent=2))
+            return JSONResponse(body, upstream.status_code)
+
+        return JSONResponse(synthesise(provider, path))
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--fixtures", type=Path)
+    parser.add_argument("--record", action="store_true")
+    args = parser.parse_args()
+    if args.record and args.fixtures is None:
+        parser.error("--record needs --fixtures to save responses to")
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate,
+        fixtures=args.fixtures,
+        record=args.record,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Drive the API at a fixed concurrency and report throughput and latency.
+
+Start the API against the mock providers (see ``loadtest.mock_providers``), then::
+
+    python -m loadtest.run --base-url http://localhost:8000 --concurrency 20
+
+Each scenario is run in turn with ``--requests`` calls spread over
+``--concurrency`` workers.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+SCENARIOS: dict[str, tuple[str, str]] = {
+    "portfolio": ("GET", "/portfolio"),
+    "portfolio_live": ("GET", "/portfolio/live"),
+    "history": ("GET", "/history?years=1"),
+    "history_returns": ("GET", "/history/returns?years=1"),
+    "asb_value": ("GET", "/asb/value"),
+    "bnz_value": ("GET", "/bnz/value"),
+    "kernel_value": ("GET", "/kernel/value"),
+    "sharesies_value": ("GET", "/sharesies/value"),
+    "simplicity_value": ("GET", "/simplicity/value"),
+    "snapshot": ("POST", "/portfolio"),
+}
+
+
+class Result:
+    def __init__(self, name: str, latencies: list[float], errors: int, elapsed: float):
+        self.name = name
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.elapsed = elapsed
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return float("nan")
+        index = min(len(self.latencies) - 1, round(p / 100 * len(self.latencies)))
+        return self.latencies[index] * 1000
+
+    def row(self) -> str:
+        count = len(self.latencies) + self.errors
+        return (
+            f"{self.name:<18}{count:>7}{self.errors:>7}"
+            f"{count / self.elapsed:>10.1f}"
+            f"{self.percentile(50):>10.1f}{self.percentile(99):>10.1f}"
+        )
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, name: str, requests: int, concurrency: int
+) -> Result:
+    method, path = SCENARIOS[name]
+    remaining = iter(range(requests))
+    latencies: list[float] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        for _ in remaining:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path)
+                failed = response.is_error
+            except httpx.HTTPError:
+                failed = True
+            if failed:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return Result(name, latencies, errors, time.perf_counter() - start)
+
+
+async def main(args: argparse.Namespace) -> None:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.base_url, timeout=args.timeout, limits=limits
+    ) as client:
+        print(
+            f"{'scenario':<18}{'count':>7}{'errors':>7}{'req/s':>10}"
+            f"{'p50 ms':>10}{'p99 ms':>10}"
+        )
+        for name in args.scenarios:
+            result = await run_scenario(client, name, args.requests, args.concurrency)
+            print(result.row())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=SCENARIOS,
+        default=[name for name in SCENARIOS if name != "snapshot"],
+        help="Defaults to everything except the snapshot pipeline, which writes",
+    )
+    asyncio.run(main(parser.parse_args()))
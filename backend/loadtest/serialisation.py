@@ -0,0 +1,91 @@
+"""Compare CPU time and bytes for encoding multi-year history responses.
+
+Builds rows shaped like ``/history``'s (one per day, one column per account) and
+serves them through FastAPI's default validated encoding and through the orjson
+path the history endpoints use, each with and without gzip::
+
+    python -m loadtest.serialisation --years 5 --accounts 8
+"""
+
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi.testclient import TestClient
+
+Rows = list[dict[str, float | str | date | None]]
+
+
+def history_rows(years: int, accounts: int) -> Rows:
+    rng = random.Random(0)
+    start = date.today() - timedelta(days=365 * years)
+    names = [f"Platform {i // 2} - Account {i}" for i in range(accounts)]
+    amounts = [rng.uniform(1_000, 50_000) for _ in names]
+    rows = []
+    for day in range(365 * years):
+        for i, amount in enumerate(amounts):
+            amounts[i] = round(amount * rng.gauss(1.0002, 0.005), 2)
+        rows.append(
+            {"nz_date": start + timedelta(days=day)}
+            # Accounts opened part way through are null until they start
+            | {
+                name: amount if day >= i * 30 else None
+                for i, (name, amount) in enumerate(zip(names, amounts, strict=True))
+            }
+        )
+    return rows
+
+
+def build_app(rows: Rows, trusted: bool, gzip_level: int | None) -> FastAPI:
+    app = FastAPI()
+    if gzip_level is not None:
+        app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=gzip_level)
+
+    if trusted:
+
+        @app.get("/history")
+        def history() -> ORJSONResponse:
+            return ORJSONResponse(rows)
+
+    else:
+
+        @app.get("/history")
+        def history() -> Rows:
+            return rows
+
+    return app
+
+
+def measure(app: FastAPI, repeat: int) -> tuple[float, int]:
+    """Mean CPU milliseconds per request and bytes on the wire."""
+    with TestClient(app) as client:
+        client.get("/history")  # Warm up
+        start = time.process_time()
+        for _ in range(repeat):
+            response = client.get("/history", headers={"Accept-Encoding": "gzip"})
+        elapsed = time.process_time() - start
+    return elapsed / repeat * 1000, response.num_bytes_downloaded
+
+
+def main(args: argparse.Namespace) -> None:
+    rows = history_rows(args.years, args.accounts)
+    print(f"{len(rows)} days x {args.accounts} accounts\n")
+    print(f"{'encoder':<10}{'gzip':>6}{'cpu ms':>10}{'bytes':>12}")
+    for trusted in (False, True):
+        for level in (None, *args.gzip_levels):
+            cpu, size = measure(build_app(rows, trusted, level), args.repeat)
+            encoder = "orjson" if trusted else "default"
+            print(f"{encoder:<10}{level or '-':>6}{cpu:>10.1f}{size:>12,}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--accounts", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--gzip-levels", type=int, nargs="+", default=[1, 6, 9])
+    main(parser.parse_args())
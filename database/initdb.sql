@@ -3,11 +3,118 @@ CREATE TABLE
         time TIMESTAMPTZ NOT NULL,
         platform VARCHAR NOT NULL,
         account VARCHAR NOT NULL,
-        amount DOUBLE PRECISION NOT NULL
+        amount DOUBLE PRECISION NOT NULL,
+        inserted_at TIMESTAMPTZ DEFAULT now(),
+        tenant VARCHAR NOT NULL DEFAULT 'default'
     )
 WITH
     (
         timescaledb.hypertable,
         timescaledb.partition_column = 'time',
-        timescaledb.segmentby = 'platform'
-    );
\ No newline at end of file
+        timescaledb.segmentby = 'tenant, platform'
+    );
+
+CREATE INDEX savings_inserted_at_idx ON savings (inserted_at DESC);
+CREATE INDEX savings_tenant_platform_account_time_idx ON savings (tenant, platform, account, time DESC);
+CREATE INDEX savings_tenant_inserted_at_idx ON savings (tenant, inserted_at DESC);
+
+CREATE MATERIALIZED VIEW savings_hourly
+WITH
+    (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket (INTERVAL '1 hour', time) AS bucket,
+    tenant,
+    platform,
+    account,
+    last (amount, time) AS amount,
+    MAX(time) AS time
+FROM savings
+GROUP BY bucket, tenant, platform, account
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW savings_daily
+WITH
+    (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket (INTERVAL '1 day', bucket, 'Pacific/Auckland') AS bucket,
+    tenant,
+    platform,
+    account,
+    last (amount, time) AS amount,
+    MAX(time) AS time
+FROM savings_hourly
+GROUP BY 1, tenant, platform, account
+WITH NO DATA;
+
+CREATE INDEX savings_hourly_tenant_platform_account_bucket_idx
+    ON savings_hourly (tenant, platform, account, bucket DESC);
+CREATE INDEX savings_daily_tenant_platform_account_bucket_idx
+    ON savings_daily (tenant, platform, account, bucket DESC);
+
+-- Refresh far enough back to pick up backfills like identify_expired's
+SELECT add_continuous_aggregate_policy ('savings_hourly',
+    start_offset => INTERVAL '30 days',
+    end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '1 hour');
+SELECT add_continuous_aggregate_policy ('savings_daily',
+    start_offset => INTERVAL '30 days',
+    end_offset => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour');
+
+-- Past amounts, including an unchanged account's latest one, are read from the
+-- rollups, which outlive raw snapshots. Retention must stay longer than the
+-- refresh windows above, or the rollups lose data.
+SELECT add_retention_policy ('savings', drop_after => INTERVAL '90 days');
+SELECT add_retention_policy ('savings_hourly', drop_after => INTERVAL '2 years');
+
+CREATE TABLE
+    transactions (
+        time TIMESTAMPTZ NOT NULL,
+        platform VARCHAR NOT NULL,
+        account VARCHAR NOT NULL,
+        transaction_id VARCHAR NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        type VARCHAR NOT NULL,
+        description VARCHAR NOT NULL,
+        inserted_at TIMESTAMPTZ DEFAULT now(),
+        tenant VARCHAR NOT NULL DEFAULT 'default',
+        UNIQUE (transaction_id, time)
+    )
+WITH
+    (
+        timescaledb.hypertable,
+        timescaledb.partition_column = 'time',
+        timescaledb.segmentby = 'tenant, platform'
+    );
+
+CREATE INDEX transactions_inserted_at_idx ON transactions (inserted_at DESC);
+CREATE INDEX transactions_tenant_platform_account_time_idx ON transactions (tenant, platform, account, time DESC);
+CREATE INDEX transactions_tenant_inserted_at_idx ON transactions (tenant, inserted_at DESC);
+
+CREATE TABLE
+    tenants (
+        tenant VARCHAR PRIMARY KEY,
+        akahu_id VARCHAR NOT NULL,
+        auth_token VARCHAR NOT NULL,
+        -- SHA-256 hex digest of the tenant's API key
+        api_key_hash VARCHAR
+    );
+
+CREATE TABLE
+    accounts (
+        tenant VARCHAR NOT NULL REFERENCES tenants ON DELETE CASCADE,
+        platform VARCHAR NOT NULL,
+        account VARCHAR NOT NULL,
+        akahu_account_id VARCHAR NOT NULL,
+        balance_field VARCHAR NOT NULL DEFAULT 'current',
+        PRIMARY KEY (tenant, platform, account)
+    );
+
+CREATE TABLE
+    account_heartbeats (
+        tenant VARCHAR NOT NULL DEFAULT 'default',
+        platform VARCHAR NOT NULL,
+        account VARCHAR NOT NULL,
+        last_seen TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (tenant, platform, account)
+    );
@@ -0,0 +1,6 @@
+-- Track when each row was written so /history can serve incremental syncs.
+-- Existing rows are left NULL and fall back to their sample time.
+ALTER TABLE savings ADD COLUMN IF NOT EXISTS inserted_at TIMESTAMPTZ;
+ALTER TABLE savings ALTER COLUMN inserted_at SET DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS savings_inserted_at_idx ON savings (inserted_at DESC);
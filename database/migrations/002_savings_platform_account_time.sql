@@ -0,0 +1,4 @@
+-- Lets /history find each account's last value before a date range without a
+-- full scan.
+CREATE INDEX IF NOT EXISTS savings_platform_account_time_idx
+    ON savings (platform, account, time DESC);
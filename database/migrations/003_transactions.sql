@@ -0,0 +1,22 @@
+-- Deposits/withdrawals from Akahu, used to separate contributions from growth.
+CREATE TABLE IF NOT EXISTS
+    transactions (
+        time TIMESTAMPTZ NOT NULL,
+        platform VARCHAR NOT NULL,
+        account VARCHAR NOT NULL,
+        transaction_id VARCHAR NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        type VARCHAR NOT NULL,
+        description VARCHAR NOT NULL,
+        inserted_at TIMESTAMPTZ DEFAULT now(),
+        UNIQUE (transaction_id, time)
+    )
+WITH
+    (
+        timescaledb.hypertable,
+        timescaledb.partition_column = 'time',
+        timescaledb.segmentby = 'platform'
+    );
+
+CREATE INDEX IF NOT EXISTS transactions_inserted_at_idx
+    ON transactions (inserted_at DESC);
@@ -0,0 +1,8 @@
+-- Lease rows so only one API worker runs each scheduled job firing.
+CREATE TABLE IF NOT EXISTS
+    job_runs (
+        job VARCHAR NOT NULL,
+        slot TIMESTAMPTZ NOT NULL,
+        owner VARCHAR NOT NULL,
+        PRIMARY KEY (job, slot)
+    );
@@ -0,0 +1,35 @@
+-- Separate portfolios per user. Existing rows belong to the 'default' tenant,
+-- whose accounts and credentials still come from the environment.
+ALTER TABLE savings ADD COLUMN IF NOT EXISTS tenant VARCHAR NOT NULL DEFAULT 'default';
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS tenant VARCHAR NOT NULL DEFAULT 'default';
+
+-- Only affects chunks compressed from now on
+ALTER TABLE savings SET (timescaledb.segmentby = 'tenant, platform');
+ALTER TABLE transactions SET (timescaledb.segmentby = 'tenant, platform');
+
+DROP INDEX IF EXISTS savings_platform_account_time_idx;
+CREATE INDEX IF NOT EXISTS savings_tenant_platform_account_time_idx
+    ON savings (tenant, platform, account, time DESC);
+CREATE INDEX IF NOT EXISTS savings_tenant_inserted_at_idx
+    ON savings (tenant, inserted_at DESC);
+CREATE INDEX IF NOT EXISTS transactions_tenant_platform_account_time_idx
+    ON transactions (tenant, platform, account, time DESC);
+CREATE INDEX IF NOT EXISTS transactions_tenant_inserted_at_idx
+    ON transactions (tenant, inserted_at DESC);
+
+CREATE TABLE IF NOT EXISTS
+    tenants (
+        tenant VARCHAR PRIMARY KEY,
+        akahu_id VARCHAR NOT NULL,
+        auth_token VARCHAR NOT NULL
+    );
+
+CREATE TABLE IF NOT EXISTS
+    accounts (
+        tenant VARCHAR NOT NULL REFERENCES tenants ON DELETE CASCADE,
+        platform VARCHAR NOT NULL,
+        account VARCHAR NOT NULL,
+        akahu_account_id VARCHAR NOT NULL,
+        balance_field VARCHAR NOT NULL DEFAULT 'current',
+        PRIMARY KEY (tenant, platform, account)
+    );
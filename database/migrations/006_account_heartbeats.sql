@@ -0,0 +1,10 @@
+-- When each account was last fetched, so accounts saved only on change aren't
+-- mistaken for expired ones.
+CREATE TABLE IF NOT EXISTS
+    account_heartbeats (
+        tenant VARCHAR NOT NULL DEFAULT 'default',
+        platform VARCHAR NOT NULL,
+        account VARCHAR NOT NULL,
+        last_seen TIMESTAMPTZ NOT NULL,
+        PRIMARY KEY (tenant, platform, account)
+    );
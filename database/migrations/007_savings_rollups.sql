@@ -0,0 +1,56 @@
+-- Hourly and daily rollups of snapshots, so intraday saves don't slow history
+-- queries. Each bucket keeps its last amount and when it was observed. Daily
+-- buckets are NZ days, built from the hourly ones.
+CREATE MATERIALIZED VIEW IF NOT EXISTS savings_hourly
+WITH
+    (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket (INTERVAL '1 hour', time) AS bucket,
+    tenant,
+    platform,
+    account,
+    last (amount, time) AS amount,
+    MAX(time) AS time
+FROM savings
+GROUP BY bucket, tenant, platform, account
+WITH NO DATA;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS savings_daily
+WITH
+    (timescaledb.continuous, timescaledb.materialized_only = false) AS
+SELECT
+    time_bucket (INTERVAL '1 day', bucket, 'Pacific/Auckland') AS bucket,
+    tenant,
+    platform,
+    account,
+    last (amount, time) AS amount,
+    MAX(time) AS time
+FROM savings_hourly
+GROUP BY 1, tenant, platform, account
+WITH NO DATA;
+
+CREATE INDEX IF NOT EXISTS savings_hourly_tenant_platform_account_bucket_idx
+    ON savings_hourly (tenant, platform, account, bucket DESC);
+CREATE INDEX IF NOT EXISTS savings_daily_tenant_platform_account_bucket_idx
+    ON savings_daily (tenant, platform, account, bucket DESC);
+
+-- Refresh far enough back to pick up backfills like identify_expired's
+SELECT add_continuous_aggregate_policy ('savings_hourly',
+    start_offset => INTERVAL '30 days',
+    end_offset => INTERVAL '1 hour',
+    schedule_interval => INTERVAL '1 hour',
+    if_not_exists => true);
+SELECT add_continuous_aggregate_policy ('savings_daily',
+    start_offset => INTERVAL '30 days',
+    end_offset => INTERVAL '1 day',
+    schedule_interval => INTERVAL '1 hour',
+    if_not_exists => true);
+
+CALL refresh_continuous_aggregate ('savings_hourly', NULL, NULL);
+CALL refresh_continuous_aggregate ('savings_daily', NULL, NULL);
+
+-- Past amounts, including an unchanged account's latest one, are read from the
+-- rollups, which outlive raw snapshots. Retention must stay longer than the
+-- refresh windows above, or the rollups lose data.
+SELECT add_retention_policy ('savings', drop_after => INTERVAL '90 days', if_not_exists => true);
+SELECT add_retention_policy ('savings_hourly', drop_after => INTERVAL '2 years', if_not_exists => true);
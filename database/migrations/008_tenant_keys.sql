@@ -0,0 +1,3 @@
+-- Tenants authenticate with an API key, stored as its SHA-256 hex digest.
+-- Tenants added before this have none until an admin issues one.
+ALTER TABLE tenants ADD COLUMN IF NOT EXISTS api_key_hash VARCHAR;
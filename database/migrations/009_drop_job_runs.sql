@@ -0,0 +1,3 @@
+-- Scheduled job leases moved to the workers' shared outbox file, so they can be
+-- claimed while Postgres is down.
+DROP TABLE IF EXISTS job_runs;
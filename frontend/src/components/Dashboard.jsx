@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import {
   LineChart,
   Line,
@@ -60,7 +60,24 @@ const API_URL = getApiUrl();
 console.log("API URL:", API_URL);
 console.log("REACT_APP_BACKEND_PORT:", process.env.REACT_APP_BACKEND_PORT);
 
+// Merge pushed history rows into the current window. A re-saved day updates in
+// place; a new day starts from the latest known values (like the backend's
+// forward fill) so accounts that haven't been saved yet don't drop to zero.
+const mergeHistoryRows = (existing, incoming) => {
+  const byDate = new Map(existing.map((row) => [row.nz_date, row]));
+  incoming.forEach((row) => {
+    let base = byDate.get(row.nz_date);
+    if (base === undefined) {
+      const latestDate = Array.from(byDate.keys()).sort().pop();
+      base = latestDate !== undefined ? byDate.get(latestDate) : {};
+    }
+    byDate.set(row.nz_date, { ...base, ...row });
+  });
+  return Array.from(byDate.values());
+};
+
 function Dashboard() {
+  const [rawData, setRawData] = useState([]);
   const [data, setData] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
@@ -69,10 +86,55 @@ function Dashboard() {
   const [months, setMonths] = useState(3);
   const [days, setDays] = useState(0);
   const [hideSensitive, setHideSensitive] = useState(true);
+  // Version of the history we hold, used to fetch only what changed since
+  const historyVersion = useRef(null);
 
   useEffect(() => {
     fetchData();
-  }, [years, months, days, hideSensitive]);
+  }, [years, months, days]);
+
+  useEffect(() => {
+    buildChart(rawData);
+  }, [rawData, hideSensitive]);
+
+  // New snapshots are pushed by the backend, so append them instead of refetching
+  // the whole window. After a dropped connection, catch up on anything missed.
+  useEffect(() => {
+    const source = new EventSource(`${API_URL}/portfolio/stream`);
+    let connected = false;
+    source.addEventListener("open", () => {
+      if (connected) {
+        syncChanges();
+      }
+      connected = true;
+    });
+    source.addEventListener("snapshot", (event) => {
+      const rows = JSON.parse(event.data);
+      setRawData((previous) => mergeHistoryRows(previous, rows));
+    });
+    return () => source.close();
+  }, [years, months, days]);
+
+  const historyUrl = () =>
+    `${API_URL}/history?years=${years}&months=${months}&days=${days}`;
+
+  const syncChanges = async () => {
+    if (!historyVersion.current) {
+      return;
+    }
+    try {
+      const cursor = encodeURIComponent(historyVersion.current);
+      const response = await fetch(`${historyUrl()}&cursor=${cursor}`);
+      if (!response.ok) {
+        return;
+      }
+      historyVersion.current = response.headers.get("X-History-Version");
+      const rows = await response.json();
+      setRawData((previous) => mergeHistoryRows(previous, rows));
+    } catch (err) {
+      console.log("Failed to sync history changes:", err.message);
+    }
+  };
 
   const fetchData = async () => {
     try {
@@ -80,134 +142,136 @@ function Dashboard() {
       setError(null);
       // Always fetch absolute history; we derive returns client-side so that
       // percentages match between sensitive and non-sensitive modes.
-      const url = `${API_URL}/history?years=${years}&months=${months}&days=${days}`;
+      const url = historyUrl();
       console.log("Fetching from:", url);
       const response = await fetch(url);
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
-      const rawData = await response.json();
-
-      // Transform data for recharts
-      // rawData is a list of dicts with nz_date and investment names as keys
-      const chartData = rawData.map((item) => {
-        const transformed = { date: item.nz_date };
-        // Copy all investment keys (everything except nz_date)
-        Object.keys(item).forEach((key) => {
-          if (key !== "nz_date") {
-            transformed[key] = item[key] || 0;
-          }
-        });
-        return transformed;
+      historyVersion.current = response.headers.get("X-History-Version");
+      setRawData(await response.json());
+      setLoading(false);
+    } catch (err) {
+      setError(err.message);
+      setLoading(false);
+    }
+  };
+
+  const buildChart = (rawData) => {
+    // Transform data for recharts
+    // rawData is a list of dicts with nz_date and investment names as keys
+    const chartData = rawData.map((item) => {
+      const transformed = { date: item.nz_date };
+      // Copy all investment keys (everything except nz_date)
+      Object.keys(item).forEach((key) => {
+        if (key !== "nz_date") {
+          transformed[key] = item[key] || 0;
+        }
       });
+      return transformed;
+    });
 
-      // Sort by date
-      chartData.sort((a, b) => new Date(a.date) - new Date(b.date));
+    // Sort by date
+    chartData.sort((a, b) => new Date(a.date) - new Date(b.date));
 
-      // Work out investment keys (exclude date)
-      let investmentKeys = [];
-      if (chartData.length > 0) {
-        investmentKeys = Object.keys(chartData[0]).filter(
-          (key) => key !== "date"
-        );
-      }
+    // Work out investment keys (exclude date)
+    let investmentKeys = [];
+    if (chartData.length > 0) {
+      investmentKeys = Object.keys(chartData[0]).filter(
+        (key) => key !== "date"
+      );
+    }
 
-      // Compute baseline (oldest) values for each investment for returns mode
-      const baselineByInvestment = {};
-      investmentKeys.forEach((key) => {
-        const firstWithValue = chartData.find(
-          (row) => row[key] !== null && row[key] !== undefined && row[key] !== 0
-        );
-        baselineByInvestment[key] = firstWithValue ? firstWithValue[key] : 0;
-      });
+    // Compute baseline (oldest) values for each investment for returns mode
+    const baselineByInvestment = {};
+    investmentKeys.forEach((key) => {
+      const firstWithValue = chartData.find(
+        (row) => row[key] !== null && row[key] !== undefined && row[key] !== 0
+      );
+      baselineByInvestment[key] = firstWithValue ? firstWithValue[key] : 0;
+    });
+
+    const baselineTotal = investmentKeys.reduce(
+      (sum, key) => sum + (baselineByInvestment[key] || 0),
+      0
+    );
 
-      const baselineTotal = investmentKeys.reduce(
-        (sum, key) => sum + (baselineByInvestment[key] || 0),
+    // Absolute data with total line
+    const absoluteData = chartData.map((row) => {
+      const total = investmentKeys.reduce(
+        (sum, key) => sum + (row[key] || 0),
         0
       );
+      return { ...row, Total: total };
+    });
 
-      // Absolute data with total line
-      const absoluteData = chartData.map((row) => {
-        const total = investmentKeys.reduce(
-          (sum, key) => sum + (row[key] || 0),
-          0
-        );
-        return { ...row, Total: total };
-      });
+    // Returns data (cumulative return factors) with total factor
+    const returnsData = chartData.map((row) => {
+      const valueTotal = investmentKeys.reduce(
+        (sum, key) => sum + (row[key] || 0),
+        0
+      );
+      const totalFactor =
+        baselineTotal > 0 ? valueTotal / baselineTotal : 1.0;
 
-      // Returns data (cumulative return factors) with total factor
-      const returnsData = chartData.map((row) => {
-        const valueTotal = investmentKeys.reduce(
-          (sum, key) => sum + (row[key] || 0),
-          0
-        );
-        const totalFactor =
-          baselineTotal > 0 ? valueTotal / baselineTotal : 1.0;
-
-        const returnsRow = { date: row.date, Total: totalFactor };
-        investmentKeys.forEach((key) => {
-          const base = baselineByInvestment[key] || 0;
-          const current = row[key] || 0;
-          returnsRow[key] =
-            base > 0 ? current / base : 1.0; // factor relative to baseline
-        });
-        return returnsRow;
+      const returnsRow = { date: row.date, Total: totalFactor };
+      investmentKeys.forEach((key) => {
+        const base = baselineByInvestment[key] || 0;
+        const current = row[key] || 0;
+        returnsRow[key] =
+          base > 0 ? current / base : 1.0; // factor relative to baseline
       });
+      return returnsRow;
+    });
 
-      const chartDataWithTotal = hideSensitive ? returnsData : absoluteData;
-
-      setData(chartDataWithTotal);
+    const chartDataWithTotal = hideSensitive ? returnsData : absoluteData;
 
-      // Calculate stats from absolute data so percentages match between modes
-      if (absoluteData.length > 0) {
-        const latestAbs = absoluteData[absoluteData.length - 1];
-        const oldestAbs = absoluteData[0];
+    setData(chartDataWithTotal);
 
-        const investmentKeysForStats = Object.keys(latestAbs).filter(
-          (key) => key !== "date" && key !== "Total"
-        );
+    // Calculate stats from absolute data so percentages match between modes
+    if (absoluteData.length > 0) {
+      const latestAbs = absoluteData[absoluteData.length - 1];
+      const oldestAbs = absoluteData[0];
 
-        const totalLatest = latestAbs.Total;
-        const totalOldest = oldestAbs.Total;
-        const totalChange = totalLatest - totalOldest;
-        const totalChangePercent =
-          totalOldest > 0
-            ? parseFloat(((totalChange / totalOldest) * 100).toFixed(2))
-            : 0;
+      const investmentKeysForStats = Object.keys(latestAbs).filter(
+        (key) => key !== "date" && key !== "Total"
+      );
 
-        // Calculate period label
-        const periodParts = [];
-        if (years > 0) {
-          periodParts.push(`${years} ${years === 1 ? "year" : "years"}`);
-        }
-        if (months > 0) {
-          periodParts.push(`${months} ${months === 1 ? "month" : "months"}`);
-        }
-        if (days > 0) {
-          periodParts.push(`${days} ${days === 1 ? "day" : "days"}`);
-        }
-        const periodLabelWithDays = (() => {
-          return periodParts.join(" and ") || "period";
-        })();
-
-        setStats({
-          totalLatest,
-          totalOldest,
-          totalChange,
-          totalChangePercent,
-          investmentKeys: investmentKeysForStats,
-          latest: hideSensitive
-            ? returnsData[returnsData.length - 1]
-            : latestAbs,
-          periodLabel: periodLabelWithDays,
-          isReturns: hideSensitive,
-        });
+      const totalLatest = latestAbs.Total;
+      const totalOldest = oldestAbs.Total;
+      const totalChange = totalLatest - totalOldest;
+      const totalChangePercent =
+        totalOldest > 0
+          ? parseFloat(((totalChange / totalOldest) * 100).toFixed(2))
+          : 0;
+
+      // Calculate period label
+      const periodParts = [];
+      if (years > 0) {
+        periodParts.push(`${years} ${years === 1 ? "year" : "years"}`);
       }
-
-      setLoading(false);
-    } catch (err) {
-      setError(err.message);
-      setLoading(false);
+      if (months > 0) {
+        periodParts.push(`${months} ${months === 1 ? "month" : "months"}`);
+      }
+      if (days > 0) {
+        periodParts.push(`${days} ${days === 1 ? "day" : "days"}`);
+      }
+      const periodLabelWithDays = (() => {
+        return periodParts.join(" and ") || "period";
+      })();
+
+      setStats({
+        totalLatest,
+        totalOldest,
+        totalChange,
+        totalChangePercent,
+        investmentKeys: investmentKeysForStats,
+        latest: hideSensitive
+          ? returnsData[returnsData.length - 1]
+          : latestAbs,
+        periodLabel: periodLabelWithDays,
+        isReturns: hideSensitive,
+      });
     }
   };
 